@@ -0,0 +1,132 @@
+import io
+import struct
+import threading
+import uuid
+import numpy as np
+
+SAMPLE_RATE = 16000
+
+
+class AudioStore:
+    """
+    單一錄音共用的 16-bit PCM 緩衝區。
+    底層是一塊連續的 int16 陣列，容量不足時以倍增方式擴充 (攤銷 O(1) 的 append)，
+    WAV 寫檔、即時辨識與最終辨識都透過 view() 讀取同一份資料，不會另外複製。
+    """
+
+    def __init__(self, sample_rate: int = SAMPLE_RATE, initial_seconds: float = 10.0):
+        self.sample_rate = sample_rate
+        self._data = np.empty(int(sample_rate * initial_seconds), dtype=np.int16)
+        self._length = 0
+        self._odd_byte = b""  # 上一個 chunk 留下不足一個取樣點的位元組
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._length
+
+    @property
+    def duration(self) -> float:
+        return self._length / self.sample_rate
+
+    def append(self, chunk: bytes) -> np.ndarray:
+        """加入一段音訊，回傳這段音訊在緩衝區中的 view"""
+        if self._odd_byte:
+            chunk = self._odd_byte + chunk
+            self._odd_byte = b""
+        if len(chunk) % 2:
+            self._odd_byte = chunk[-1:]
+            chunk = chunk[:-1]
+        samples = np.frombuffer(chunk, dtype=np.int16)
+
+        with self._lock:
+            start = self._length
+            end = start + len(samples)
+            if end > len(self._data):
+                # 擴充時舊的 view 仍指向舊陣列，其中已寫入的資料不會再變動，因此可以安全地繼續讀取
+                grown = np.empty(max(end, len(self._data) * 2), dtype=np.int16)
+                grown[:start] = self._data[:start]
+                self._data = grown
+            self._data[start:end] = samples
+            self._length = end
+            return self._data[start:end]
+
+    def view(self, start: int = 0, end: int = None) -> np.ndarray:
+        """回傳 [start, end) 範圍的零複製 view"""
+        with self._lock:
+            end = self._length if end is None else min(end, self._length)
+            return self._data[start:end]
+
+
+def wav_header(num_samples: int, sample_rate: int = SAMPLE_RATE) -> bytes:
+    """產生 16-bit 單聲道 PCM 的 44 位元組 WAV 標頭"""
+    data_size = num_samples * 2
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 36 + data_size, b"WAVE",
+        b"fmt ", 16, 1, 1, sample_rate, sample_rate * 2, 2, 16,
+        b"data", data_size,
+    )
+
+
+class BufferChain(io.RawIOBase):
+    """把多段 bytes / memoryview 串成一個可 seek 的唯讀串流，讀取時才逐段複製，不會先合併成一大塊"""
+
+    def __init__(self, buffers):
+        self._buffers = [memoryview(b).cast("B") for b in buffers]
+        self._size = sum(len(b) for b in self._buffers)
+        self._pos = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self._size
+        self._pos = min(max(offset, 0), self._size)
+        return self._pos
+
+    def readinto(self, b) -> int:
+        target = memoryview(b).cast("B")
+        written = 0
+        start = 0
+        for buf in self._buffers:
+            end = start + len(buf)
+            if self._pos < end and written < len(target):
+                local = self._pos - start
+                n = min(len(buf) - local, len(target) - written)
+                target[written:written + n] = buf[local:local + n]
+                written += n
+                self._pos += n
+            start = end
+        return written
+
+
+def multipart_wav_body(samples: np.ndarray, fields: dict, sample_rate: int = SAMPLE_RATE):
+    """
+    組出 multipart/form-data 請求內容：表單欄位加上一個 WAV 檔案欄位，
+    WAV 標頭在記憶體中產生，PCM 直接引用 samples 的 view，不寫暫存檔。
+    回傳 (Content-Type, body)
+    """
+    boundary = uuid.uuid4().hex
+    head = "".join(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="{key}"\r\n\r\n{value}\r\n'
+        for key, value in fields.items()
+    )
+    head += (
+        f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="audio.wav"\r\n'
+        f"Content-Type: audio/wav\r\n\r\n"
+    )
+    tail = f"\r\n--{boundary}--\r\n"
+    body = BufferChain([head.encode("utf-8"), wav_header(len(samples), sample_rate), samples, tail.encode("utf-8")])
+    return f"multipart/form-data; boundary={boundary}", body
@@ -0,0 +1,288 @@
+import asyncio
+import json
+import os
+import time
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+import soundfile as sf
+
+from vad import SpeechSegmenter
+from whisper_client import LANGUAGE_MAP
+
+SAMPLE_RATE = 16000
+# 每段送 Whisper 的音訊長度上限 (秒)，在這個長度內盡量於靜音處切開
+BATCH_MAX_CHUNK_SECONDS = float(os.getenv("BATCH_MAX_CHUNK_SECONDS", "30"))
+# 同時送出的段數，預設與 Whisper 後端數量相同
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "0"))
+# 一次翻譯請求的段數 (DeepL 單次上限為 50)
+TRANSLATE_BATCH = 50
+# 記憶體中最多保留的工作數，超過時移除最舊的已結束工作
+MAX_JOBS = 200
+# 轉錄中回報進度到 bus 的最短間隔 (秒)
+PROGRESS_INTERVAL = 1.0
+
+
+def load_audio(path: str, sample_rate: int = SAMPLE_RATE, block_seconds: float = 10.0) -> np.ndarray:
+    """
+    逐塊讀取音訊檔並轉成單聲道 int16，取樣率不同時逐塊線性內插重新取樣；
+    同時只有一小塊原始音訊在記憶體中，長錄音也只佔用輸出的 int16 陣列
+    """
+    with sf.SoundFile(path) as f:
+        rate = f.samplerate
+        ratio = rate / sample_rate
+        output = np.empty(int(f.frames / ratio) + 1, dtype=np.int16)
+        written = 0
+        consumed = 0  # 已讀入的原始取樣數
+        previous = None  # 上一塊的最後一個取樣，讓內插跨塊連續
+        for block in f.blocks(blocksize=max(1, int(block_seconds * rate)), dtype="float32", always_2d=True):
+            mono = block.mean(axis=1)
+            if rate == sample_rate:
+                samples = mono
+            else:
+                base = consumed
+                if previous is not None:
+                    mono = np.concatenate([[previous], mono])
+                    base -= 1
+                last = consumed + len(block) - 1
+                count = int(last / ratio) + 1 - written
+                positions = (np.arange(written, written + count, dtype=np.float64) * ratio) - base
+                samples = np.interp(positions, np.arange(len(mono)), mono).astype(np.float32)
+                previous = mono[-1]
+            consumed += len(block)
+            if written + len(samples) > len(output):
+                output = np.concatenate([output, np.empty(written + len(samples) - len(output), dtype=np.int16)])
+            output[written:written + len(samples)] = (np.clip(samples, -1.0, 1.0) * 32767).astype(np.int16)
+            written += len(samples)
+    return output[:written]
+
+
+def split_at_silence(ranges: list, max_samples: int) -> list:
+    """
+    把 VAD 語音範圍合併成不超過 max_samples 的段落，切點都落在靜音中；
+    單一語音範圍本身太長時才硬切
+    """
+    chunks = []
+    current = None
+    for start, end in ranges:
+        while end - start > max_samples:
+            if current is not None:
+                chunks.append(tuple(current))
+                current = None
+            chunks.append((start, start + max_samples))
+            start += max_samples
+        if current is None:
+            current = [start, end]
+        elif end - current[0] <= max_samples:
+            current[1] = end
+        else:
+            chunks.append(tuple(current))
+            current = [start, end]
+    if current is not None:
+        chunks.append(tuple(current))
+    return chunks
+
+
+def segments_from_response(response: dict, offset: float, duration: float) -> list:
+    """把一段的 Whisper 結果轉成整段錄音時間軸上的 [{"start", "end", "text"}]"""
+    segments = []
+    for segment in response.get("segments") or []:
+        text = segment.get("text", "").strip()
+        if text:
+            segments.append({
+                "start": round(offset + float(segment["start"]), 2),
+                "end": round(offset + float(segment["end"]), 2),
+                "text": text,
+            })
+    if not segments and response.get("text", "").strip():
+        segments.append({"start": round(offset, 2), "end": round(offset + duration, 2), "text": response["text"].strip()})
+    return segments
+
+
+class BatchJob:
+    def __init__(self, path: str, language_code: str, sha256: str = None):
+        self.id = uuid.uuid4().hex[:12]
+        self.path = path
+        self.language_code = language_code
+        self.sha256 = sha256
+        self.status = "queued"  # queued / running / done / error
+        self.stage = ""
+        self.total = 0
+        self.done = 0
+        self.error = None
+        self.translation_error = None  # 翻譯失敗或語言不支援翻譯時的原因，轉錄結果仍然有效
+        self.result = None
+        self.created = time.time()
+        self.finished = None
+        self.published = 0.0  # 上一次回報狀態到 bus 的時間
+
+    def to_dict(self, include_result: bool = True) -> dict:
+        data = {
+            "job_id": self.id,
+            "status": self.status,
+            "stage": self.stage,
+            "language": self.language_code,
+            "progress": round(self.done / self.total, 3) if self.total else (1.0 if self.status == "done" else 0.0),
+            "chunks_done": self.done,
+            "chunks_total": self.total,
+            "error": self.error,
+            "translation_error": self.translation_error,
+            "elapsed": round((self.finished or time.time()) - self.created, 2),
+        }
+        if include_result and self.result is not None:
+            data["result"] = self.result
+        return data
+
+
+class BatchTranscriber:
+    """
+    上傳錄音的批次轉錄工作：
+    以 VAD 在靜音處把長音訊切成多段，限制同時數量平行送到各個 Whisper 後端，
+    依時間戳把結果接回整段錄音，再以批次翻譯；工作進度可隨時查詢。
+    相同內容 (sha256) 與語言的上傳會共用同一個工作 (同一個 worker 內)。
+    有 bus 時工作狀態會同步寫入 bus，多個 worker 時查詢送到哪個 worker 都能取得。
+    """
+
+    def __init__(self, whisper_client, translation_dispatcher=None, concurrency: int = BATCH_CONCURRENCY,
+                 max_chunk_seconds: float = BATCH_MAX_CHUNK_SECONDS, sample_rate: int = SAMPLE_RATE, bus=None):
+        self.whisper_client = whisper_client
+        self.translation_dispatcher = translation_dispatcher
+        self.bus = bus
+        self.concurrency = concurrency or max(1, len(getattr(whisper_client, "backends", [])))
+        self.max_samples = int(max_chunk_seconds * sample_rate)
+        self.sample_rate = sample_rate
+        self.jobs = OrderedDict()  # job_id -> BatchJob
+        self.by_content = {}  # (sha256, language_code) -> job_id
+
+    def submit(self, path: str, language_code: str, sha256: str = None) -> BatchJob:
+        key = (sha256, language_code)
+        if sha256 and key in self.by_content:
+            job = self.jobs.get(self.by_content[key])
+            if job is not None and job.status != "error":
+                return job
+
+        job = BatchJob(path, language_code, sha256)
+        self.jobs[job.id] = job
+        if sha256:
+            self.by_content[key] = job.id
+        self._trim()
+        asyncio.get_running_loop().create_task(self._run(job))
+        return job
+
+    def get(self, job_id: str):
+        return self.jobs.get(job_id)
+
+    async def status(self, job_id: str):
+        """工作狀態 (完成時含結果)；不在這個 worker 時向 bus 查詢，找不到回傳 None"""
+        job = self.jobs.get(job_id)
+        if job is not None:
+            return job.to_dict(include_result=job.status == "done")
+        if self.bus is not None:
+            return await self.bus.load_job(job_id)
+        return None
+
+    async def _publish(self, job: BatchJob):
+        if self.bus is None:
+            return
+        job.published = time.time()
+        try:
+            await self.bus.save_job(job.id, job.to_dict(include_result=job.status == "done"))
+        except Exception as e:
+            print(f"⚠️ 回報批次轉錄 {job.id} 狀態失敗: {e}")
+
+    def _trim(self):
+        for job_id in list(self.jobs):
+            if len(self.jobs) <= MAX_JOBS:
+                break
+            job = self.jobs[job_id]
+            if job.status in ("done", "error"):
+                del self.jobs[job_id]
+                if self.by_content.get((job.sha256, job.language_code)) == job_id:
+                    del self.by_content[(job.sha256, job.language_code)]
+
+    async def _run(self, job: BatchJob):
+        loop = asyncio.get_running_loop()
+        job.status = "running"
+        try:
+            job.stage = "decoding"
+            await self._publish(job)
+            audio = await loop.run_in_executor(None, load_audio, job.path, self.sample_rate)
+            segmenter = SpeechSegmenter(sample_rate=self.sample_rate)
+            await loop.run_in_executor(None, self._segment, segmenter, audio)
+            ranges = segmenter.speech_ranges(0, len(audio))
+            if not ranges and len(audio):
+                # VAD 沒有找到語音時不直接回傳空結果，改以固定長度切開整段音訊
+                ranges = [(0, len(audio))]
+            chunks = split_at_silence(ranges, self.max_samples)
+            job.total = len(chunks)
+            print(f"📼 批次轉錄 {job.id}: {len(audio) / self.sample_rate:.1f} 秒音訊，切成 {len(chunks)} 段")
+
+            job.stage = "transcribing"
+            await self._publish(job)
+            semaphore = asyncio.Semaphore(self.concurrency)
+
+            async def transcribe(start: int, end: int) -> list:
+                async with semaphore:
+                    response = await self.whisper_client.transcribe(audio[start:end], job.language_code)
+                if response.get("error"):
+                    raise RuntimeError(f"第 {start / self.sample_rate:.1f} 秒的段落辨識失敗: {response.get('text')}")
+                job.done += 1
+                if time.time() - job.published >= PROGRESS_INTERVAL:
+                    await self._publish(job)
+                return segments_from_response(response, start / self.sample_rate, (end - start) / self.sample_rate)
+
+            results = await asyncio.gather(*(transcribe(start, end) for start, end in chunks))
+            segments = [segment for chunk in results for segment in chunk]
+
+            source_lang = LANGUAGE_MAP.get(job.language_code)
+            if self.translation_dispatcher is not None and job.language_code != "cmn-Hant-TW" and segments:
+                if source_lang is None:
+                    # 不支援的語言 (例如 unknown) 只提供轉錄結果
+                    job.translation_error = f"不支援翻譯的語言: {job.language_code}"
+                else:
+                    job.stage = "translating"
+                    await self._publish(job)
+                    await self._translate(job, segments, source_lang.upper())
+
+            job.result = {
+                "text": " ".join(segment["text"] for segment in segments) if job.language_code != "cmn-Hant-TW"
+                else "".join(segment["text"] for segment in segments),
+                "duration": round(len(audio) / self.sample_rate, 2),
+                "segments": segments,
+            }
+            await loop.run_in_executor(None, self._save, job)
+            job.stage = ""
+            job.status = "done"
+        except Exception as e:
+            print(f"⚠️ 批次轉錄 {job.id} 失敗: {e}")
+            job.status = "error"
+            job.error = str(e)
+        finally:
+            job.finished = time.time()
+            await self._publish(job)
+
+    async def _translate(self, job: BatchJob, segments: list, source_lang: str):
+        """翻譯失敗時記錄在工作上，已完成的轉錄結果照常保留"""
+        texts = [segment["text"] for segment in segments]
+        try:
+            batches = await asyncio.gather(*(
+                self.translation_dispatcher.translate_many(texts[i:i + TRANSLATE_BATCH], source_lang)
+                for i in range(0, len(texts), TRANSLATE_BATCH)
+            ))
+        except Exception as e:
+            print(f"⚠️ 批次轉錄 {job.id} 翻譯失敗，只保留轉錄結果: {e}")
+            job.translation_error = str(e)
+            return
+        for segment, translation in zip(segments, (t for batch in batches for t in batch)):
+            segment["translation"] = translation
+
+    def _segment(self, segmenter: SpeechSegmenter, audio: np.ndarray, block_seconds: float = 10.0):
+        # 與即時錄音一樣逐塊送入 VAD，不必為整段錄音建立浮點數副本
+        block = int(block_seconds * self.sample_rate)
+        for start in range(0, len(audio), block):
+            segmenter.feed(audio[start:start + block])
+
+    def _save(self, job: BatchJob):
+        with open(f"{os.path.splitext(job.path)[0]}.transcript.json", "w", encoding="utf-8") as f:
+            json.dump(job.result, f, ensure_ascii=False)
@@ -0,0 +1,188 @@
+import asyncio
+import json
+import os
+import time
+from collections import deque
+
+# 每個聽眾最多排隊的訊息數 (temp 訊息合併後計算)，超過代表對方長時間收不完，直接踢掉
+CLIENT_QUEUE_SIZE = int(os.getenv("BROADCAST_QUEUE_SIZE", "256"))
+# 單次送出的逾時秒數，網路卡住的聽眾不會一直佔著傳送工作
+SEND_TIMEOUT = float(os.getenv("BROADCAST_SEND_TIMEOUT", "5"))
+# 每場會議在記憶體中保留最近幾則 final 訊息，新加入的聽眾先收到這些紀錄
+HISTORY_SIZE = int(os.getenv("BROADCAST_HISTORY_SIZE", "200"))
+
+
+def encode_message(message: dict) -> str:
+    return json.dumps(message, ensure_ascii=False, separators=(",", ":"))
+
+
+def message_key(message: dict):
+    """同一則發言的同一種內容 (轉錄 / 翻譯) 共用一個 key"""
+    return (message.get("id"), message.get("label"))
+
+
+class Envelope:
+    """一則廣播訊息；JSON 只序列化一次，各聽眾的精簡格式編碼結果也在這裡共用"""
+
+    __slots__ = ("message", "key", "temp", "_text", "_memo")
+
+    def __init__(self, message: dict):
+        self.message = message
+        self.key = message_key(message)
+        self.temp = message.get("status") == "temp"
+        self._text = None
+        self._memo = {}
+
+    def text(self) -> str:
+        if self._text is None:
+            self._text = encode_message(self.message)
+        return self._text
+
+    def memo(self, key, build):
+        value = self._memo.get(key)
+        if value is None:
+            value = self._memo[key] = build()
+        return value
+
+
+class BroadcastClient:
+    """
+    單一聽眾的傳送佇列，由自己的 task 依序送出，慢的聽眾不會拖到其他人。
+    同一個 (id, label) 的 temp 訊息只保留最新一則：還沒送出的舊 temp 直接被取代，
+    final 進佇列時會丟掉同一個 key 尚未送出的 temp；final 一律依序送達。
+    """
+
+    def __init__(self, websocket, broadcaster, queue_size: int = CLIENT_QUEUE_SIZE, codec=None):
+        self.websocket = websocket
+        self.broadcaster = broadcaster
+        self.codec = codec  # None 代表使用原本的 JSON 文字格式
+        self.queue_size = queue_size
+        self.pending = deque()  # [key, envelope]，envelope 為 None 代表已被 final 取代
+        self.temps = {}  # key -> 佇列中尚未送出的 temp 項目
+        self.size = 0
+        self.ready = asyncio.Event()
+        self.task = None
+
+    def offer(self, envelope: Envelope) -> bool:
+        key, temp = envelope.key, envelope.temp
+        entry = self.temps.get(key) if key is not None else None
+        if entry is not None:
+            if temp:
+                entry[1] = envelope
+                return True
+            entry[1] = None
+            self.size -= 1
+            del self.temps[key]
+        if self.size >= self.queue_size:
+            return False
+        entry = [key, envelope]
+        self.pending.append(entry)
+        self.size += 1
+        if temp and key is not None:
+            self.temps[key] = entry
+        self.ready.set()
+        return True
+
+    async def run(self):
+        while True:
+            if not self.pending:
+                self.ready.clear()
+                await self.ready.wait()
+                continue
+            entry = self.pending.popleft()
+            key, envelope = entry
+            if envelope is None:
+                continue
+            self.size -= 1
+            if self.temps.get(key) is entry:
+                del self.temps[key]
+            try:
+                await asyncio.wait_for(self._send(envelope), self.broadcaster.send_timeout)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ 廣播失敗，移除聽眾 (會議 {self.broadcaster.meeting_id}): {e!r}")
+                self.broadcaster.remove(self.websocket, close=True)
+                return
+
+    async def _send(self, envelope: Envelope):
+        # 精簡格式要依這條連線已送出的內容計算差異，所以在送出當下才編碼
+        if self.codec is None:
+            await self.websocket.send_text(envelope.text())
+            return
+        for frame in self.codec.encode(envelope):
+            await self.websocket.send_bytes(frame)
+
+
+class MeetingBroadcaster:
+    """
+    會議內的廣播器：每則訊息只序列化 / 編碼一次，放進各聽眾有上限的傳送佇列，
+    由各自的 task 送出；佇列滿了或送出失敗的聽眾會被移除。
+    所有方法都必須在事件迴圈的執行緒中呼叫。
+    """
+
+    def __init__(self, meeting_id: str, queue_size: int = CLIENT_QUEUE_SIZE, send_timeout: float = SEND_TIMEOUT,
+                 history_size: int = HISTORY_SIZE):
+        self.meeting_id = meeting_id
+        self.queue_size = queue_size
+        self.send_timeout = send_timeout
+        self.clients = {}  # websocket -> BroadcastClient
+        self.history = deque(maxlen=history_size)  # 最近的 final 訊息 (Envelope)
+        self.last_active = time.monotonic()  # 最後一次有訊息或聽眾進出的時間
+
+    def __len__(self):
+        return len(self.clients)
+
+    def snapshot(self, since=None) -> list:
+        """記憶體中的 final 訊息；有 since 時只取最後一則 id == since 的訊息之後的部分"""
+        history = list(self.history)
+        if since is not None:
+            for i in range(len(history) - 1, -1, -1):
+                if history[i].message.get("id") == since:
+                    return history[i + 1:]
+        return history
+
+    def add(self, websocket, codec=None, since=None) -> BroadcastClient:
+        """加入聽眾；先排入歷史紀錄，之後才是即時訊息"""
+        self.last_active = time.monotonic()
+        client = BroadcastClient(websocket, self, self.queue_size, codec)
+        for envelope in self.snapshot(since):
+            if not client.offer(envelope):
+                break
+        client.task = asyncio.get_running_loop().create_task(client.run())
+        self.clients[websocket] = client
+        return client
+
+    def remove(self, websocket, close: bool = False):
+        client = self.clients.pop(websocket, None)
+        if client is None:
+            return
+        self.last_active = time.monotonic()
+        if client.task is not None and client.task is not asyncio.current_task():
+            client.task.cancel()
+        if close:
+            # 關閉連線後，該聽眾的接收迴圈會收到斷線並結束
+            asyncio.get_running_loop().create_task(self._close(websocket))
+
+    async def _close(self, websocket):
+        try:
+            await asyncio.wait_for(websocket.close(code=1008), self.send_timeout)
+        except Exception:
+            pass
+
+    def idle_for(self) -> float:
+        """沒有聽眾時已閒置的秒數，還有聽眾時回傳 0"""
+        return 0.0 if self.clients else time.monotonic() - self.last_active
+
+    def publish(self, message: dict):
+        self.last_active = time.monotonic()
+        envelope = Envelope(message)
+        if message.get("status") == "final":
+            self.history.append(envelope)
+        for websocket, client in list(self.clients.items()):
+            if not client.offer(envelope):
+                print(f"⚠️ 聽眾接收過慢，移除 (會議 {self.meeting_id})")
+                self.remove(websocket, close=True)
+
+    async def broadcast(self, message: dict):
+        self.publish(message)
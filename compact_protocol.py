@@ -0,0 +1,87 @@
+import os
+
+try:
+    import msgpack
+except ImportError:  # 沒有安裝 msgpack 時，所有聽眾都使用 JSON
+    msgpack = None
+
+# 客戶端以 ?protocol=compact 或 Sec-WebSocket-Protocol 要求精簡格式
+COMPACT_SUBPROTOCOL = "icsd.compact.v1"
+COMPACT_QUERY_VALUE = "compact"
+
+# 精簡格式的每個 binary frame 都是一個 MessagePack 陣列，第一個元素是 frame 種類：
+#   [FRAME_INTERN, 種類, 編號, 字串]  定義這條連線上的講者 (0) / 語言 (1) 編號
+#   [FRAME_MESSAGE, id, label, status, 講者編號, 語言編號, keep, suffix]
+#       文字 = 同一個 (id, label) 上一次的文字[:keep] + suffix；final 之後重新從空字串開始
+#   [FRAME_RAW, 訊息]  無法精簡表示的其他訊息，原樣送出
+FRAME_INTERN = 0
+FRAME_MESSAGE = 1
+FRAME_RAW = 2
+
+INTERN_NAME = 0
+INTERN_LANGUAGE = 1
+
+LABELS = {"transcript": 0, "translate": 1}
+STATUSES = {"temp": 0, "final": 1}
+
+
+def compact_available() -> bool:
+    return msgpack is not None
+
+
+def negotiate(websocket):
+    """回傳 (是否使用精簡格式, 要回覆的 subprotocol)；沒有 msgpack 時一律退回 JSON"""
+    if msgpack is None:
+        return False, None
+    requested = websocket.scope.get("subprotocols") or []
+    if COMPACT_SUBPROTOCOL in requested:
+        return True, COMPACT_SUBPROTOCOL
+    return websocket.query_params.get("protocol") == COMPACT_QUERY_VALUE, None
+
+
+def common_prefix_length(a: str, b: str) -> int:
+    return len(os.path.commonprefix([a, b]))
+
+
+class CompactCodec:
+    """
+    單一連線的精簡格式編碼狀態：講者與語言字串第一次出現時配給編號，
+    之後只送編號；文字只送與上一次相同 (id, label) 相比的差異。
+    """
+
+    def __init__(self):
+        self.interned = ({}, {})  # 講者、語言 -> 編號
+        self.previous = {}  # (id, label) -> 已送出的文字
+
+    def _intern(self, kind: int, value: str, frames: list) -> int:
+        table = self.interned[kind]
+        index = table.get(value)
+        if index is None:
+            index = table[value] = len(table)
+            frames.append(msgpack.packb([FRAME_INTERN, kind, index, value]))
+        return index
+
+    def encode(self, envelope) -> list:
+        message = envelope.message
+        label = LABELS.get(message.get("label"))
+        status = STATUSES.get(message.get("status"))
+        text = message.get("message")
+        if label is None or status is None or not isinstance(text, str):
+            return [envelope.memo("raw", lambda: msgpack.packb([FRAME_RAW, message]))]
+
+        frames = []
+        name = self._intern(INTERN_NAME, str(message.get("name", "")), frames)
+        language = self._intern(INTERN_LANGUAGE, str(message.get("language", "")), frames)
+        previous = self.previous.get(envelope.key, "")
+
+        def pack():
+            keep = common_prefix_length(previous, text)
+            return msgpack.packb([FRAME_MESSAGE, message.get("id"), label, status, name, language, keep, text[keep:]])
+
+        # 狀態相同的聽眾 (多數情況) 共用同一份編碼結果
+        frames.append(envelope.memo((previous, name, language), pack))
+        if status == STATUSES["temp"]:
+            self.previous[envelope.key] = text
+        else:
+            self.previous.pop(envelope.key, None)
+        return frames
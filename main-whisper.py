@@ -1,11 +1,13 @@
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, UploadFile, File, Request, HTTPException
-from fastapi.responses import JSONResponse, HTMLResponse, Response
+from fastapi.responses import JSONResponse, HTMLResponse, Response, StreamingResponse, FileResponse
 from fastapi.middleware.cors import CORSMiddleware
 import wave
 import datetime
 import os
 import asyncio
+import sys
 import threading
+import time
 from uuid import uuid4
 import vertexai
 from  vertexai.generative_models  import  GenerativeModel 
@@ -26,9 +28,21 @@ import random
 
 from final_recognizer import final_transcribe
 from stream_recognizer import StreamRecognizer
+from whisper_client import get_whisper_client
+from summarizer import MeetingSummarizer, SummarizerBusy, build_summary_prompt
+from audio_store import AudioStore
+from recording_writer import RecordingWriter, find_recording
+from upload_store import UploadStore, UploadTooLarge, InvalidAudio
+from batch_transcriber import BatchTranscriber
+from meeting_bus import create_meeting_bus, RedisMeetingBus
+from compact_protocol import CompactCodec, negotiate as negotiate_compact
 from mongodb_atlas import *
+from session_cache import SessionStore
+from meeting_log import MeetingLogStore
 from mistral import *
 from translate.translate_deepl import *
+from translate.translation_cache import get_translation_cache
+from translate.translation_dispatcher import TranslationDispatcher
 
 # GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 # genai.configure(api_key=GEMINI_API_KEY)
@@ -36,6 +50,7 @@ PROJECT_ID = os.getenv("PROJECT_ID")
 REGION = "us-central1" 
 vertexai.init(project=PROJECT_ID,  location=REGION) 
 model  =  GenerativeModel(  "gemini-1.5-pro-002"  ) 
+summarizer = MeetingSummarizer(model)
 GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
 
 # MODEL_NAME = "large"
@@ -58,9 +73,41 @@ app.add_middleware(SessionMiddleware, secret_key=SECRET_KEY, same_site="none", h
 
 mongo_db = None
 db = None
-session_collection = None
+sessions_collection = None
+session_store = None
+batch_transcriber = None
 translator = None
+translation_dispatcher = None
 mistral_api = None
+whisper_client = get_whisper_client()
+# 會議清單、訊息編號與廣播都經過 bus，多個 worker 時設定 MEETING_BUS_URL 指向 Redis
+meeting_bus = create_meeting_bus()
+WORKERS = int(os.getenv("WORKERS", "1"))
+
+
+def configured_workers() -> int:
+    """
+    實際的 worker 數：WORKERS、WEB_CONCURRENCY 環境變數，或 uvicorn / gunicorn 命令列的 --workers / -w；
+    uvicorn 以 spawn 啟動 worker，子行程的 sys.argv 與主行程相同
+    """
+    count = max(WORKERS, int(os.getenv("WEB_CONCURRENCY", "1") or "1"))
+    argv = sys.argv
+    for i, arg in enumerate(argv):
+        value = None
+        if arg in ("--workers", "-w") and i + 1 < len(argv):
+            value = argv[i + 1]
+        elif arg.startswith("--workers="):
+            value = arg.split("=", 1)[1]
+        if value and value.isdigit():
+            count = max(count, int(value))
+    return count
+
+
+def check_meeting_bus():
+    # 行程內的 bus 只看得到自己 worker 的會議與聽眾，多個 worker 會讓會議彼此不相通
+    workers = configured_workers()
+    if workers > 1 and not isinstance(meeting_bus, RedisMeetingBus):
+        raise RuntimeError(f"{workers} 個 worker 需要共用的會議 bus，請設定 MEETING_BUS_URL=redis://...")
 
 
 SAVE_DIR = "recordings"
@@ -68,52 +115,107 @@ os.makedirs(SAVE_DIR, exist_ok=True)
 LOG_DIR = "logs"
 os.makedirs(LOG_DIR, exist_ok=True)
 TRANS_DIR = "translates"
-os.makedirs(SAVE_DIR, exist_ok=True)
+os.makedirs(TRANS_DIR, exist_ok=True)
 UPLOAD_DIR = "upload"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
+upload_store = UploadStore(UPLOAD_DIR)
+
+# 會議紀錄由背景執行緒批次寫入，並維護 message id 索引供分頁讀取
+transcript_log_store = MeetingLogStore(LOG_DIR)
+translate_log_store = MeetingLogStore(TRANS_DIR)
+
+# 串流翻譯時 temp 譯文的最短廣播間隔 (秒)
+PARTIAL_TRANSLATION_INTERVAL = 0.2
+
+@app.on_event("startup")
+async def startup():
+    global mongo_db, db, translator, translation_dispatcher, mistral_api, sessions_collection, session_store, batch_transcriber
+    check_meeting_bus()
+    mongo_db = connect_to_mongodb()
+    db = mongo_db["database"]
+    translator = DeeplTranslator(AUTH_KEY)
+    translation_dispatcher = TranslationDispatcher(translator)
+    batch_transcriber = BatchTranscriber(whisper_client, translation_dispatcher, bus=meeting_bus)
+    mistral_api = MistralAPI(os.getenv("MISTRAL_API_KEY"))
+    sessions_collection = AsyncCollection(db["sessions"])
+    session_store = SessionStore(sessions_collection, bus=meeting_bus)
+    try:
+        await session_store.ensure_indexes()
+    except Exception as e:
+        print(f"⚠️ 建立 session_id 索引失敗: {e}")
+    await meeting_bus.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    loop = asyncio.get_running_loop()
+    for store in (transcript_log_store, translate_log_store):
+        await loop.run_in_executor(None, store.flush, 5)
+    await whisper_client.aclose()
+    await meeting_bus.close()
+
+@app.get("/whisper/backends")
+async def whisper_backends():
+    return JSONResponse(content={"backends": whisper_client.stats()})
 
-broadcast_clients = []
-meetings = {}
-global message_id
+@app.get("/sessions/stats")
+async def session_stats():
+    return JSONResponse(content=session_store.stats())
+
+@app.get("/translation_cache/stats")
+async def translation_cache_stats():
+    return JSONResponse(content=get_translation_cache().stats())
 
 @app.post("/summarize")
 async def summarize_meeting(request: Request):
     data = await request.json()
+    meeting_id = data.get("meeting_id", "")
     meeting_text = data.get("text", "")
 
-    if not meeting_text:
+    if not meeting_id and not meeting_text:
         return JSONResponse(content={"success": False, "message": "沒有會議內容"}, status_code=400)
 
-    prompt = f"""
-    你是一個專業的筆記整理助理，請根據以下的逐字稿，撰寫中文為主的摘要並以 Markdown 格式輸出：
-
-    ```
-    {meeting_text}
-    ```
-
-    ## 格式要求：
-    - 使用 **標題** 來區分不同議題
-    - 以 **條列清單** 方式整理重點
-    - 重要資訊請用 **加粗**
-    """
-    
-    print(prompt)
+    if meeting_id and any(sep in meeting_id for sep in ("/", "\\", "..")):
+        return JSONResponse(content={"success": False, "message": "無效的會議 ID"}, status_code=400)
+
+    if meeting_id:
+        # 伺服器端依 logs/{meeting_id}.json 分段摘要，已摘要過的段落走快取
+        log_path = f"{LOG_DIR}/{meeting_id}.json"
+        chunks = lambda: summarizer.stream_meeting(log_path)
+        complete = lambda: summarizer.summarize_meeting(log_path)
+    else:
+        prompt = build_summary_prompt(meeting_text)
+        chunks = lambda: summarizer.stream(prompt)
+        complete = lambda: summarizer.summarize(prompt)
+
+    # 前端要求串流時以 SSE 逐段回傳 Markdown
+    if data.get("stream") or "text/event-stream" in request.headers.get("accept", ""):
+        if summarizer.waiting >= summarizer.max_waiting:
+            return JSONResponse(content={"success": False, "message": "目前摘要請求過多，請稍後再試"}, status_code=429)
+
+        async def events():
+            try:
+                async for chunk in chunks():
+                    yield f"data: {json.dumps({'markdown': chunk}, ensure_ascii=False)}\n\n"
+                yield "event: done\ndata: {}\n\n"
+            except Exception as e:
+                yield f"event: error\ndata: {json.dumps({'message': str(e)}, ensure_ascii=False)}\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
 
     try:
-        response = model.generate_content(prompt)
-        markdown_text = response.text if response.text else "摘要生成失敗"
+        markdown_text = await complete()
+        markdown_text = markdown_text if markdown_text else "摘要生成失敗"
 
         return JSONResponse(content={"success": True, "markdown": markdown_text})
+    except SummarizerBusy as e:
+        return JSONResponse(content={"success": False, "message": str(e)}, status_code=429)
     except Exception as e:
         return JSONResponse(content={"success": False, "message": str(e)}, status_code=500)
 
 @app.post("/create")
 async def create_meeting():
     meeting_id = str(uuid4())[:8]  # 生成簡短的 8 碼會議 ID
-    meetings[meeting_id] = {
-        "recordings": [],
-        "clients": []
-    }
+    await meeting_bus.register_meeting(meeting_id)
     return JSONResponse(content={"meeting_id": meeting_id})
 
 @app.post("/record/start")
@@ -123,66 +225,30 @@ async def start_recording(request: Request):
     recording_id = datetime.datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:-3] + "_" + language
     return JSONResponse(content={"recording_id": recording_id})
 
+async def read_meeting_log(store, meeting_id: str, after_id: int = None, limit: int = None):
+    """沒有帶 after_id / limit 時維持原本回傳每行 JSON 字串的格式，否則只回傳之後的紀錄 (已解析)"""
+    loop = asyncio.get_running_loop()
+    if after_id is None and limit is None:
+        try:
+            logs = await loop.run_in_executor(None, store.read_lines, meeting_id)
+            return JSONResponse(content=logs)
+        except FileNotFoundError:
+            return JSONResponse(content={})
+
+    records = await loop.run_in_executor(None, store.read, meeting_id, after_id, limit)
+    next_after_id = records[-1].get("id") if records else after_id
+    return JSONResponse(content={"records": records, "next_after_id": next_after_id})
+
 @app.get("/transcript_log")
-async def get_log(meeting_id: str):
-    try:
-        with open(f"{LOG_DIR}/{meeting_id}.json", "r") as f:
-            logs = f.readlines()
-        return JSONResponse(content=logs)
-    except FileNotFoundError:
-        return JSONResponse(content={})
+async def get_log(meeting_id: str, after_id: int = None, limit: int = None):
+    return await read_meeting_log(transcript_log_store, meeting_id, after_id, limit)
     
 @app.get("/translate_log")
-async def get_log(meeting_id: str):
-    try:
-        with open(f"{TRANS_DIR}/{meeting_id}.json", "r") as f:
-            logs = f.readlines()
-        return JSONResponse(content=logs)
-    except FileNotFoundError:
-        return JSONResponse(content={})
-
-import requests
-import json
-import tempfile
-import os
-
-WHISPER_SERVER_URL = "http://10.121.240.4"
-LANGUAGE_MAP = {
-    "en-US": "en",
-    "cmn-Hant-TW": "zh",
-    "ja-JP": "ja",
-    "de-DE": "de",
-}
-
-def transcript_audio(wave_path: str, language_code: str) -> str:
-    """發送音訊數據到 GPU Whisper 伺服器進行轉錄"""
-    # 創建一個臨時音訊檔案
-    # with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as temp_file:
-    #     temp_file.write(audio_data)
-    #     temp_file_path = temp_file.name
-
-    try:
-        # 設定請求參數
-        files = {"file": open(wave_path, "rb")}
-        data = {"language": LANGUAGE_MAP.get(language_code, "en")}
-
-        # 發送 POST 請求到 Whisper 伺服器
-        response = requests.post(f"{WHISPER_SERVER_URL}{random.randint(0, 1)}:876{random.randint(0, 3)}/transcribe", files=files, data=data)
-
-        if response.status_code == 200:
-            return response.json().get("text", "Transcription failed")
-        else:
-            return f"Error: {response.status_code} - {response.text}"
-    except Exception as e:
-        return f"Exception: {str(e)}"
-    # finally:
-        # 移除臨時音訊檔案
-        # os.remove(temp_file_path)
-
+async def get_translate_log(meeting_id: str, after_id: int = None, limit: int = None):
+    return await read_meeting_log(translate_log_store, meeting_id, after_id, limit)
 
 @app.websocket("/ws/record/{meeting_id}/{recording_id}")
 async def websocket_record(websocket: WebSocket, meeting_id: str, recording_id: str, session_id: str):
-    global message_id
     await websocket.accept()
     
     print(f"🔗 WebSocket 連線已建立: 會議 {meeting_id}, 錄音 ID {recording_id}")
@@ -190,21 +256,17 @@ async def websocket_record(websocket: WebSocket, meeting_id: str, recording_id:
     if not session_id:
         await websocket.close()
         return
-    user = find_one(sessions_collection, {"session_id": session_id})
+    user = await session_store.get(session_id)
     name = user["name"] if user else "Unknown"
 
 
     # 確保會議 ID 存在
-    if meeting_id not in meetings:
-        meetings[meeting_id] = {"clients": []}
+    await meeting_bus.register_meeting(meeting_id)
+    broadcaster = meeting_bus.channel(meeting_id)
 
-    # 創建音訊存檔
+    # 創建音訊存檔 (背景執行緒邊錄邊壓縮成 FLAC / Opus)
     os.makedirs(f"{SAVE_DIR}/{meeting_id}", exist_ok=True)
-    filename = f"{SAVE_DIR}/{meeting_id}/{recording_id}.wav"
-    wav_file = wave.open(filename, "wb")
-    wav_file.setnchannels(1)
-    wav_file.setsampwidth(2)
-    wav_file.setframerate(16000)
+    recording = RecordingWriter(f"{SAVE_DIR}/{meeting_id}/{recording_id}")
 
     # 解析語言代碼
     parts = recording_id.rsplit("_", 1)
@@ -217,16 +279,14 @@ async def websocket_record(websocket: WebSocket, meeting_id: str, recording_id:
     }
     language = language_map.get(language_code, "Unknown")
 
-    # 會議內部的 `broadcast_clients`
-    broadcast_clients = meetings[meeting_id]["clients"]
-
-    # 音訊緩存
-    audio_buffer = []
+    # 這次錄音唯一的音訊緩存，錄音寫檔、即時辨識與最終辨識共用
+    audio_store = AudioStore()
     
     # 建立即時辨識器
     loop = asyncio.get_running_loop()
-    message_id += 1
-    recognizer = StreamRecognizer(language_code, loop, broadcast_clients, message_id, name, language, translator)
+    # 這次錄音的訊息編號，final 訊息也使用同一個編號
+    message_id = await meeting_bus.next_message_id()
+    recognizer = StreamRecognizer(language_code, loop, broadcaster, message_id, name, language, translator, audio_store, whisper_client, translation_dispatcher)
     
     # 在背景執行緒中啟動即時辨識
     recognition_thread = threading.Thread(
@@ -241,9 +301,9 @@ async def websocket_record(websocket: WebSocket, meeting_id: str, recording_id:
 
             if "bytes" in data:
                 chunk = data["bytes"]
-                audio_buffer.append(np.frombuffer(chunk, dtype=np.int16))
-                recognizer.add_audio_data(chunk) 
-                wav_file.writeframes(chunk)
+                samples = audio_store.append(chunk)
+                recognizer.add_audio_data(samples)
+                recording.write(samples)
             
             elif "text" in data and data["text"] == "STOP":
                 print("🛑 收到 STOP 訊號，開始轉錄語音...")
@@ -256,28 +316,32 @@ async def websocket_record(websocket: WebSocket, meeting_id: str, recording_id:
         recognizer.stop()
         recognition_thread.join(timeout=5)  # 最多等待 5 秒確保音訊處理完成
         print("✅ 音訊處理已完成")
-        wav_file.close()
-        print(f"🎙️ 錄音檔案已儲存: {filename}")
+        await loop.run_in_executor(None, recording.close)
+        print(f"🎙️ 錄音檔案已儲存: {recording.path}")
+
+        # 只保留 VAD 標記的語音片段，長時間的靜音不送 Whisper
+        speech_audio = recognizer.segmenter.compact(audio_store.view())
+        if len(speech_audio) == 0:
+            # VAD 判斷錯誤時不能讓整段發言消失，改送完整錄音
+            print("⚠️ 錄音中沒有偵測到語音，改以完整錄音進行最終辨識")
+            speech_audio = audio_store.view()
 
         # 確保音訊數據處理完畢
-        if len(audio_buffer) > 0:
+        final_text = ""
+        if len(speech_audio) > 0:
             # audio_data = np.concatenate(audio_buffer, axis=0).astype(np.float32) / 32768.0  # 轉換成 float32
             # print("🎤 轉錄音訊中...")
             
-            if not audio_buffer:
-                print("⚠️ 音訊緩衝區為空，無法轉錄")
-                return
-            
-            # 2️⃣ **將音訊緩衝區轉換成 NumPy 陣列**
-            audio_data = np.concatenate([np.frombuffer(chunk, dtype=np.int16) for chunk in audio_buffer])
-            
-            # 3️⃣ **確保音訊數據正確並寫入 WAV 檔案**
-            wav_path = f"{filename}.wav"
-            sf.write(wav_path, audio_data, samplerate=16000, subtype="PCM_16")
-            print(f"🎙️ 音訊檔案已儲存：{wav_path}")
-            
-            final_text = await loop.run_in_executor(None, transcript_audio, wav_path, language_code)
+            # 直接以記憶體中的音訊組出 WAV 送出，不需要再讀檔
+            final_result = await whisper_client.transcribe(speech_audio, language_code)
+            if final_result.get("error"):
+                # 錯誤訊息不能當成發言內容廣播、翻譯或寫進紀錄，改用即時辨識累積的逐字稿
+                print("⚠️ 最終辨識失敗，改用暫時辨識結果:", final_result.get("text"))
+                final_text = recognizer.partial.text
+            else:
+                final_text = final_result.get("text", "").strip()
             print("🔍 原始辨識結果:", final_text)
+        if final_text:
 
             # 使用 Whisper 進行語音轉錄
             # result = whisper_model.transcribe(audio_data, language=language_map.get(language_code), fp16=True)
@@ -286,14 +350,6 @@ async def websocket_record(websocket: WebSocket, meeting_id: str, recording_id:
             # final_text = result["text"]
             # print("🔍 原始辨識結果:", final_text)
         
-            to_remove = []
-            async def broadcast_message(message):
-                for client in broadcast_clients:
-                    try:
-                        await client.send_json(message)
-                    except Exception as e:
-                        print("⚠️ 廣播即時辨識結果失敗:", e)
-                        to_remove.append(client)
             print("🔍 原始辨識結果:", final_text)
             
             final_message = {
@@ -305,20 +361,47 @@ async def websocket_record(websocket: WebSocket, meeting_id: str, recording_id:
                 "label": "transcript"
             }
             
-            await broadcast_message(final_message)
+            broadcaster.publish(final_message)
             
-            processed_data = await loop.run_in_executor(None, mistral_api.translate_to_chinese, final_text)
-            # make processed_data into json
-            print("結果:", processed_data, type(processed_data))
-            processed_data = json.loads(processed_data)
-            print("結果:", processed_data, type(processed_data))
+            # 串流翻譯：譯文邊產生邊以 temp 廣播，original / proper 在結束時才確定
+            processed_data = None
+            partial_translation = ""  # 最近一次收到的譯文，串流中斷時以它作為結果
+            last_partial_time = 0
+            try:
+                async for kind, value in mistral_api.translate_to_chinese_stream(final_text):
+                    if kind == "final":
+                        processed_data = value
+                        continue
+                    partial_translation = value
+                    if time.time() - last_partial_time >= PARTIAL_TRANSLATION_INTERVAL:
+                        last_partial_time = time.time()
+                        broadcaster.publish({
+                            "id": message_id,
+                            "message": value,
+                            "name": name,
+                            "language": language,
+                            "status": "temp",
+                            "label": "translate"
+                        })
+            except Exception as e:
+                print("⚠️ 串流翻譯失敗:", e)
+            if processed_data is None and not partial_translation:
+                # 還沒收到任何譯文就失敗時，改用非串流翻譯再試一次
+                try:
+                    content = await asyncio.get_running_loop().run_in_executor(
+                        None, mistral_api.translate_to_chinese, final_text)
+                    processed_data = mistral_api.parse_translation(content, final_text, final_text)
+                except Exception as e:
+                    print("⚠️ 翻譯失敗:", e)
+            if processed_data is None:
+                processed_data = {"original": final_text, "translation": partial_translation or final_text, "proper": []}
+            print("結果:", processed_data)
             optimized_text = processed_data["original"]
             translated_text = processed_data["translation"]
             
             
-            if "proper" in processed_data:
-                for proper in processed_data["proper"]:
-                    translated_text = translated_text + f"\n{proper}"
+            for proper in processed_data["proper"]:
+                translated_text = translated_text + f"\n{proper}"
             
             print("🔍 修正後辨識結果:", optimized_text)
 
@@ -331,7 +414,7 @@ async def websocket_record(websocket: WebSocket, meeting_id: str, recording_id:
                 "status": "final",
                 "label": "transcript"
             }
-            await broadcast_message(optimized_message)
+            broadcaster.publish(optimized_message)
             
             translated_message = {
                 "id": message_id,
@@ -341,53 +424,80 @@ async def websocket_record(websocket: WebSocket, meeting_id: str, recording_id:
                 "status": "final",
                 "label": "translate"
             }
-            await broadcast_message(translated_message)
+            broadcaster.publish(translated_message)
                 
             
             print("🔍 翻譯結果:", translated_message)
             
 
-            # 儲存會議記錄
-            with open(f"{LOG_DIR}/{meeting_id}.json", "a", encoding='utf-8') as f:
-                json.dump(optimized_message, f, ensure_ascii=False)
-                f.write("\n")  # 確保每條記錄換行
-                
-            with open(f"{TRANS_DIR}/{meeting_id}.json", "a", encoding='utf-8') as f:
-                json.dump(translated_message, f, ensure_ascii=False)
-                f.write("\n")
-            
-            
-            for client in to_remove:
-                broadcast_clients.remove(client)
+            # 儲存會議記錄 (背景批次寫入)
+            transcript_log_store.append(meeting_id, optimized_message)
+            translate_log_store.append(meeting_id, translated_message)
+
 
             print("🔴 WebSocket 連線已關閉")
 
+@app.get("/record/{meeting_id}/{recording_id}/audio")
+async def replay_recording(meeting_id: str, recording_id: str):
+    """回放壓縮後的錄音檔"""
+    if any(sep in meeting_id + recording_id for sep in ("/", "\\", "..")):
+        raise HTTPException(status_code=400, detail="無效的錄音 ID")
+    path, media_type = find_recording(f"{SAVE_DIR}/{meeting_id}/{recording_id}")
+    if path is None:
+        raise HTTPException(status_code=404, detail="找不到錄音檔")
+    return FileResponse(path, media_type=media_type, filename=os.path.basename(path))
+
 @app.post("/record/{recording_id}/upload")
-async def upload_recording(recording_id: str, file: UploadFile = File(...)):
-    upload_filename = f"{UPLOAD_DIR}/upload_recording_{recording_id}.wav"
-    content = await file.read()
-    with open(upload_filename, "wb") as f:
-        f.write(content)
-    return JSONResponse(content={"message": "File uploaded successfully", "filename": upload_filename})
+async def upload_recording(recording_id: str, request: Request):
+    # 直接串流讀取 request body，邊收邊寫檔，不把整個檔案讀進記憶體
+    if any(sep in recording_id for sep in ("/", "\\", "..")):
+        raise HTTPException(status_code=400, detail="無效的錄音 ID")
+    try:
+        result = await upload_store.save(request, f"upload_recording_{recording_id}")
+    except UploadTooLarge as e:
+        return JSONResponse(content={"message": str(e)}, status_code=413)
+    except InvalidAudio as e:
+        return JSONResponse(content={"message": str(e)}, status_code=415)
+    print(f"📥 上傳完成: {result['filename']} ({result['size']} bytes, 重複: {result['duplicate']})")
+
+    # 背景批次轉錄，相同內容與語言的上傳會共用同一個工作
+    parts = recording_id.rsplit("_", 1)
+    language_code = parts[1] if len(parts) == 2 else "en-US"
+    job = batch_transcriber.submit(result["filename"], language_code, result["sha256"])
+    return JSONResponse(content={"message": "File uploaded successfully", "job_id": job.id, **result})
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    state = await batch_transcriber.status(job_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail="找不到轉錄工作")
+    return JSONResponse(content=state)
 
 @app.websocket("/ws/broadcast/{meeting_id}")
-async def websocket_broadcast(websocket: WebSocket, meeting_id: str):
-    await websocket.accept()
+async def websocket_broadcast(websocket: WebSocket, meeting_id: str, since: int = None):
+    # 支援的客戶端可以要求 MessagePack 差異格式，其餘維持 JSON
+    compact, subprotocol = negotiate_compact(websocket)
+    await websocket.accept(subprotocol=subprotocol)
     
-    if meeting_id not in meetings:
+    if not await meeting_bus.meeting_exists(meeting_id):
         await websocket.close()
         return
 
-    meetings[meeting_id]["clients"].append(websocket)
-    print(f"廣播 WebSocket 連線已建立 (會議 {meeting_id})")
+    broadcaster = meeting_bus.local_broadcaster(meeting_id)
+    # 先送出記憶體中最近的 final 紀錄 (since 之後)，中途加入也不必再輪詢紀錄檔
+    broadcaster.add(websocket, CompactCodec() if compact else None, since)
+    print(f"廣播 WebSocket 連線已建立 (會議 {meeting_id}{', 精簡格式' if compact else ''})")
 
     try:
         while True:
-            await websocket.receive_text()
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                print(f"廣播客戶端斷開連線 (會議 {meeting_id})")
+                break
     except WebSocketDisconnect:
         print(f"廣播客戶端斷開連線 (會議 {meeting_id})")
     finally:
-        meetings[meeting_id]["clients"].remove(websocket)
+        broadcaster.remove(websocket)
 
 @app.post("/auth/google")
 async def google_auth(request: Request):
@@ -427,7 +537,7 @@ async def google_auth(request: Request):
         }
 
         print(f"✅ 驗證成功，使用者資訊: {user}")
-        insert_one(sessions_collection, user)
+        await session_store.create(user)
 
         host = request.url.hostname
         is_local = host in ["localhost", "127.0.0.1"]
@@ -452,9 +562,9 @@ async def profile(request: Request, session_id: str):
     print(session_id)
     if session_id == "0" or not session_id:
         return JSONResponse(content={"message": "找不到使用者"})
-    user = find_one(sessions_collection, {"session_id": session_id})
+    user = await session_store.get(session_id)
     if not user:
-        JSONResponse(content={"message": "找不到使用者"})
+        return JSONResponse(content={"message": "找不到使用者"})
     user["_id"] = str(user["_id"])
     print(user)
     return JSONResponse(content={"profile": user})
@@ -464,10 +574,10 @@ async def logout(request: Request, session_id: str):
     print(session_id)
     if not session_id:
         return JSONResponse(content={"message": "找不到使用者"})
-    user = find_one(sessions_collection, {"session_id": session_id})
+    user = await session_store.get(session_id)
     print("delete:", user)
     if user:
-        delete_one(sessions_collection, {"session_id": session_id})
+        await session_store.delete(session_id)
     
     request.session.clear()
     
@@ -498,10 +608,6 @@ AUTH_KEY = os.getenv("DEEPL_AUTH_KEY")
 
 if __name__ == "__main__":
     import uvicorn
-    message_id = 0
-    mongo_db = connect_to_mongodb()
-    db = mongo_db["database"]
-    translator = DeeplTranslator(AUTH_KEY)
-    mistral_api = MistralAPI(os.getenv("MISTRAL_API_KEY"))
-    sessions_collection = db["sessions"]
-    uvicorn.run(app, host="0.0.0.0", port=8765)
+    check_meeting_bus()
+    # 多個 worker 時 uvicorn 需要以匯入字串載入 app，各 worker 各自執行 startup
+    uvicorn.run(app if WORKERS == 1 else "main-whisper:app", host="0.0.0.0", port=8765, workers=WORKERS)
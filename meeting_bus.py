@@ -0,0 +1,196 @@
+import asyncio
+import itertools
+import json
+import os
+
+from broadcaster import MeetingBroadcaster
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # 單一 worker 時不需要 redis
+    aioredis = None
+
+# 未設定時使用單一行程內的 bus；多個 worker 時設成 redis://host:6379/0
+MEETING_BUS_URL = os.getenv("MEETING_BUS_URL", "memory://")
+MEETING_BUS_PREFIX = os.getenv("MEETING_BUS_PREFIX", "icsd")
+# 沒有本地聽眾且閒置超過這個秒數的廣播器會被移除 (歷史紀錄仍可從紀錄檔讀取)
+BROADCASTER_IDLE_SECONDS = float(os.getenv("BROADCASTER_IDLE_SECONDS", "1800"))
+# 批次轉錄工作狀態在 Redis 中保留的秒數
+JOB_STATE_TTL = int(os.getenv("JOB_STATE_TTL", str(24 * 3600)))
+
+
+class MeetingChannel:
+    """某場會議的發送端，辨識器與錄音流程只透過它廣播，不需要知道聽眾在哪個 worker"""
+
+    def __init__(self, bus, meeting_id: str):
+        self.bus = bus
+        self.meeting_id = meeting_id
+
+    def publish(self, message: dict):
+        self.bus.publish(self.meeting_id, message)
+
+
+class InProcessMeetingBus:
+    """
+    會議事件 bus 的行程內實作：會議清單、訊息編號與廣播都在這個行程裡，
+    只適用於單一 worker。
+    """
+
+    def __init__(self, idle_seconds: float = BROADCASTER_IDLE_SECONDS):
+        self.broadcasters = {}  # meeting_id -> 本行程的廣播器
+        self.meetings = set()
+        self.message_ids = itertools.count(1)
+        self.idle_seconds = idle_seconds
+        self.sweeper = None
+        self.session_listeners = []  # 收到 session 失效通知時呼叫，參數為 session_id
+
+    async def start(self):
+        self.sweeper = asyncio.get_running_loop().create_task(self._sweep())
+
+    async def close(self):
+        if self.sweeper is not None:
+            self.sweeper.cancel()
+
+    async def _sweep(self):
+        while True:
+            await asyncio.sleep(min(60.0, self.idle_seconds))
+            self.expire_idle()
+
+    def expire_idle(self):
+        """移除沒有本地聽眾且閒置過久的廣播器，已結束的會議不會一直佔著記憶體"""
+        for meeting_id, broadcaster in list(self.broadcasters.items()):
+            if broadcaster.idle_for() > self.idle_seconds:
+                del self.broadcasters[meeting_id]
+
+    def local_broadcaster(self, meeting_id: str) -> MeetingBroadcaster:
+        """本行程中這場會議的聽眾"""
+        broadcaster = self.broadcasters.get(meeting_id)
+        if broadcaster is None:
+            broadcaster = self.broadcasters[meeting_id] = MeetingBroadcaster(meeting_id)
+        return broadcaster
+
+    def channel(self, meeting_id: str) -> MeetingChannel:
+        return MeetingChannel(self, meeting_id)
+
+    async def register_meeting(self, meeting_id: str):
+        self.meetings.add(meeting_id)
+
+    async def meeting_exists(self, meeting_id: str) -> bool:
+        return meeting_id in self.meetings
+
+    async def next_message_id(self) -> int:
+        return next(self.message_ids)
+
+    def publish(self, meeting_id: str, message: dict):
+        self.local_broadcaster(meeting_id).publish(message)
+
+    def on_session_revoked(self, callback):
+        self.session_listeners.append(callback)
+
+    def revoke_session(self, session_id: str):
+        """通知所有 worker 這個 session 已登出，各自從快取中移除"""
+        self._session_revoked(session_id)
+
+    def _session_revoked(self, session_id: str):
+        for callback in self.session_listeners:
+            callback(session_id)
+
+    async def save_job(self, job_id: str, state: dict):
+        """單一行程時工作狀態只在 BatchTranscriber 中，不需要另外保存"""
+
+    async def load_job(self, job_id: str):
+        return None
+
+
+class RedisMeetingBus(InProcessMeetingBus):
+    """
+    以 Redis 串起多個 worker：訊息編號用 INCR、會議清單放在 set，
+    廣播經由 pub/sub 送到每個 worker，再由各自的廣播器送給本地聽眾；
+    登出時的 session 失效通知也經由 pub/sub 送到每個 worker。
+    發佈時先放進佇列，由背景 task 依序送出，保持訊息順序且不阻塞呼叫端。
+    """
+
+    def __init__(self, url: str, prefix: str = MEETING_BUS_PREFIX, idle_seconds: float = BROADCASTER_IDLE_SECONDS):
+        super().__init__(idle_seconds)
+        if aioredis is None:
+            raise RuntimeError("MEETING_BUS_URL 指定了 Redis，但沒有安裝 redis 套件")
+        self.redis = aioredis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+        self.outbox = None
+        self.tasks = []
+
+    def _key(self, *parts) -> str:
+        return ":".join((self.prefix,) + parts)
+
+    async def start(self):
+        await super().start()
+        self.outbox = asyncio.Queue()
+        pubsub = self.redis.pubsub()
+        await pubsub.psubscribe(self._key("meeting", "*"))
+        await pubsub.subscribe(self._key("session_revoked"))
+        loop = asyncio.get_running_loop()
+        self.tasks = [loop.create_task(self._read(pubsub)), loop.create_task(self._write())]
+
+    async def close(self):
+        await super().close()
+        for task in self.tasks:
+            task.cancel()
+        await self.redis.aclose()
+
+    async def _read(self, pubsub):
+        channel_prefix = self._key("meeting", "")
+        revoked_channel = self._key("session_revoked")
+        while True:
+            try:
+                async for event in pubsub.listen():
+                    if event.get("type") == "message" and event["channel"] == revoked_channel:
+                        self._session_revoked(event["data"])
+                        continue
+                    if event.get("type") != "pmessage":
+                        continue
+                    meeting_id = event["channel"][len(channel_prefix):]
+                    self.local_broadcaster(meeting_id).publish(json.loads(event["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ 會議 bus 訂閱中斷，稍後重試: {e}")
+                await asyncio.sleep(1)
+
+    async def _write(self):
+        while True:
+            channel, data = await self.outbox.get()
+            try:
+                await self.redis.publish(channel, data)
+            except Exception as e:
+                print(f"⚠️ 會議 bus 發佈失敗: {e}")
+
+    async def register_meeting(self, meeting_id: str):
+        await self.redis.sadd(self._key("meetings"), meeting_id)
+
+    async def meeting_exists(self, meeting_id: str) -> bool:
+        return bool(await self.redis.sismember(self._key("meetings"), meeting_id))
+
+    async def next_message_id(self) -> int:
+        return int(await self.redis.incr(self._key("message_id")))
+
+    def publish(self, meeting_id: str, message: dict):
+        data = json.dumps(message, ensure_ascii=False, separators=(",", ":"))
+        self.outbox.put_nowait((self._key("meeting", meeting_id), data))
+
+    def revoke_session(self, session_id: str):
+        # 自己也會從 pub/sub 收到，本機快取在 SessionStore.delete 中已先移除
+        self.outbox.put_nowait((self._key("session_revoked"), session_id))
+
+    async def save_job(self, job_id: str, state: dict):
+        """批次轉錄工作狀態寫到 Redis，查詢送到任何一個 worker 都看得到"""
+        await self.redis.set(self._key("job", job_id), json.dumps(state, ensure_ascii=False), ex=JOB_STATE_TTL)
+
+    async def load_job(self, job_id: str):
+        data = await self.redis.get(self._key("job", job_id))
+        return json.loads(data) if data else None
+
+
+def create_meeting_bus(url: str = MEETING_BUS_URL):
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisMeetingBus(url)
+    return InProcessMeetingBus()
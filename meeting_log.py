@@ -0,0 +1,243 @@
+import json
+import os
+import queue
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows 上只有單一 worker，不需要跨行程的檔案鎖
+    fcntl = None
+
+# 背景寫入時一次最多合併的筆數，與等待更多紀錄的時間 (秒)
+LOG_BATCH_SIZE = 256
+LOG_FLUSH_INTERVAL = 0.05
+
+
+class MeetingIndex:
+    """某場會議紀錄檔的位置索引：第幾筆紀錄在檔案中的 offset 與長度"""
+
+    def __init__(self):
+        self.ids = []
+        self.offsets = []
+        self.lengths = []
+        self.positions = {}  # message id -> 在紀錄中的位置
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, message_id, offset: int, length: int):
+        if message_id is not None:
+            self.positions[message_id] = len(self.ids)
+        self.ids.append(message_id)
+        self.offsets.append(offset)
+        self.lengths.append(length)
+
+    def end(self) -> int:
+        return self.offsets[-1] + self.lengths[-1] if self.ids else 0
+
+
+class MeetingLogStore:
+    """
+    會議紀錄 (每行一筆 JSON) 的儲存：append() 只把紀錄放進佇列，
+    由背景執行緒合併成批次寫入，事件迴圈不做檔案 I/O。
+    每個紀錄檔旁有 .idx 索引檔記錄每筆的 message id 與位置，
+    讀取時可以從某個 id 之後開始，只讀需要的範圍。
+    多個 worker 寫同一場會議時以檔案鎖串起寫入，讀取前會比對檔案大小，
+    把其他 worker 新增的尾段補進記憶體中的索引。
+    """
+
+    def __init__(self, directory: str, batch_size: int = LOG_BATCH_SIZE, flush_interval: float = LOG_FLUSH_INTERVAL):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.indexes = {}  # meeting_id -> MeetingIndex
+        self.thread = threading.Thread(target=self._run, daemon=True, name=f"meeting-log-{directory}")
+        self.thread.start()
+
+    def path(self, meeting_id: str) -> str:
+        return f"{self.directory}/{meeting_id}.json"
+
+    def index_path(self, meeting_id: str) -> str:
+        return f"{self.directory}/{meeting_id}.idx"
+
+    def append(self, meeting_id: str, record: dict):
+        self.queue.put((meeting_id, record))
+
+    def flush(self, timeout: float = None) -> bool:
+        """等待目前佇列中的紀錄都寫入檔案"""
+        done = threading.Event()
+        self.queue.put((None, done))
+        return done.wait(timeout)
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            grouped = {}
+            waiters = []
+            for meeting_id, record in batch:
+                if meeting_id is None:
+                    waiters.append(record)
+                else:
+                    grouped.setdefault(meeting_id, []).append(record)
+            for meeting_id, records in grouped.items():
+                try:
+                    self._write(meeting_id, records)
+                except Exception as e:
+                    print(f"⚠️ 寫入會議紀錄失敗 ({self.directory}/{meeting_id}): {e}")
+            for done in waiters:
+                done.set()
+
+    def _write(self, meeting_id: str, records: list):
+        lines = [(json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8") for record in records]
+        with open(self.path(meeting_id), "ab") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)  # 關檔時釋放
+            # 持有檔案鎖時先補上其他 worker 寫入的紀錄，offset 才會與檔案一致
+            with self.lock:
+                index = self._index(meeting_id)
+                self._refresh(meeting_id, index)
+                offset = index.end()
+            f.write(b"".join(lines))
+            f.flush()
+
+            entries = []
+            for record, line in zip(records, lines):
+                entries.append((record.get("id"), offset, len(line)))
+                offset += len(line)
+            with open(self.index_path(meeting_id), "a", encoding="utf-8") as idx:
+                idx.writelines(f"{json.dumps(message_id)}\t{start}\t{length}\n" for message_id, start, length in entries)
+            with self.lock:
+                for entry in entries:
+                    index.add(*entry)
+
+    def _refresh(self, meeting_id: str, index: MeetingIndex):
+        """紀錄檔比索引長時 (其他 worker 寫入)，只掃描新增的尾段補進索引；不完整的最後一行留到下次 (需持有 lock)"""
+        try:
+            size = os.path.getsize(self.path(meeting_id))
+        except FileNotFoundError:
+            return
+        offset = index.end()
+        if size <= offset:
+            return
+        with open(self.path(meeting_id), "rb") as f:
+            f.seek(offset)
+            data = f.read(size - offset)
+        for line in data.splitlines(keepends=True):
+            if not line.endswith(b"\n"):
+                break
+            try:
+                message_id = json.loads(line).get("id")
+            except (ValueError, AttributeError):
+                message_id = None
+            index.add(message_id, offset, len(line))
+            offset += len(line)
+
+    def _index(self, meeting_id: str) -> MeetingIndex:
+        """取得會議的索引，第一次使用時從 .idx 載入；索引檔缺漏或過期時掃描紀錄檔重建 (需持有 lock)"""
+        index = self.indexes.get(meeting_id)
+        if index is not None:
+            return index
+
+        index = MeetingIndex()
+        try:
+            size = os.path.getsize(self.path(meeting_id))
+        except FileNotFoundError:
+            size = 0
+        if size:
+            try:
+                with open(self.index_path(meeting_id), "r", encoding="utf-8") as f:
+                    for line in f:
+                        message_id, start, length = line.rstrip("\n").split("\t")
+                        if int(start) != index.end():
+                            raise ValueError("索引不連續")
+                        index.add(json.loads(message_id), int(start), int(length))
+            except (FileNotFoundError, ValueError):
+                index = MeetingIndex()
+            if not len(index) or index.end() > size:
+                index = self._rebuild(meeting_id)
+            # 索引比紀錄檔短 (其他 worker 正在寫入或索引缺漏) 時，只補上尾段
+            self._refresh(meeting_id, index)
+        self.indexes[meeting_id] = index
+        return index
+
+    def _rebuild(self, meeting_id: str) -> MeetingIndex:
+        index = MeetingIndex()
+        offset = 0
+        with open(self.path(meeting_id), "rb") as f:
+            for line in f:
+                try:
+                    message_id = json.loads(line).get("id")
+                except (ValueError, AttributeError):
+                    message_id = None
+                index.add(message_id, offset, len(line))
+                offset += len(line)
+        tmp = f"{self.index_path(meeting_id)}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.writelines(
+                f"{json.dumps(message_id)}\t{start}\t{length}\n"
+                for message_id, start, length in zip(index.ids, index.offsets, index.lengths)
+            )
+        os.replace(tmp, self.index_path(meeting_id))
+        return index
+
+    def read(self, meeting_id: str, after_id=None, limit: int = None) -> list:
+        """
+        回傳 after_id 那筆之後 (不含) 的紀錄，最多 limit 筆；after_id 為 None 時從頭開始。
+        after_id 不在紀錄中時，從最後一筆 id 比它小的紀錄之後開始，不會重送整份紀錄
+        """
+        with self.lock:
+            index = self._index(meeting_id)
+            self._refresh(meeting_id, index)
+            start = 0
+            if after_id is not None:
+                position = index.positions.get(after_id)
+                start = position + 1 if position is not None else self._seek(index, after_id)
+            end = len(index) if limit is None else min(len(index), start + max(limit, 0))
+            if start >= end:
+                return []
+            offset = index.offsets[start]
+            size = index.offsets[end - 1] + index.lengths[end - 1] - offset
+
+        with open(self.path(meeting_id), "rb") as f:
+            f.seek(offset)
+            data = f.read(size)
+        records = []
+        for line in data.splitlines():
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+        return records
+
+    @staticmethod
+    def _seek(index: MeetingIndex, after_id) -> int:
+        """由新到舊找最後一筆 id 小於 after_id 的紀錄，回傳其後的位置；id 無法比較時回傳結尾"""
+        position = len(index)
+        try:
+            while position > 0:
+                message_id = index.ids[position - 1]
+                if message_id is not None and message_id < after_id:
+                    break
+                position -= 1
+        except TypeError:
+            return len(index)
+        return position
+
+    def read_lines(self, meeting_id: str) -> list:
+        """原本的格式：整個檔案每一行的 JSON 字串"""
+        with open(self.path(meeting_id), "r", encoding="utf-8") as f:
+            return f.readlines()
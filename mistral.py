@@ -3,6 +3,10 @@ from mistralai import Mistral
 import time
 import requests
 
+from translate.translation_cache import get_translation_cache, content_version, normalize_text
+from translate.knowledge_index import KnowledgeIndex, KNOWLEDGE_PATH, VARIANTS_PATH
+from translate.partial_json import StreamingStringField, loads_tolerant
+
 
 LANGUAGE_CODE = {
     "zh": "繁體中文",
@@ -13,9 +17,13 @@ LANGUAGE_CODE = {
 
 VLLM_SERVER_URL = "http://10.121.240.40:8764/generate"
 class MistralAPI:
-    def __init__(self, api_key):
+    def __init__(self, api_key, cache=None):
         self.api_key = api_key
         self.client = Mistral(api_key=api_key)
+        self.cache = cache or get_translation_cache()
+        # 知識庫只在啟動時載入一次並建立索引，每段逐字稿只放入相關的條目
+        self.knowledge = KnowledgeIndex.from_file(KNOWLEDGE_PATH, VARIANTS_PATH)
+        self.knowledge_version = content_version(self.knowledge.header, self.knowledge.entries, self.knowledge.variants)
 
     def fix_transcript(transcript, model = 'mistral-large-latest'):
         messages = [
@@ -57,8 +65,13 @@ class MistralAPI:
 
 
     def translate_to_chinese(self, message, model = 'mistral-large-latest', language_code = 'zh'):
-        file2 = open("./translate/cmn-Hant-TW.txt", "r", encoding="utf-8")
-        Knowledge = file2.read()
+        message = normalize_text(message)
+        key = self.cache.make_key(message, "auto", language_code, f"{model}:{self.knowledge_version}")
+        return self.cache.get_or_compute(key, lambda: self._translate_to_chinese(message, model))
+
+    def _build_messages(self, message):
+        matched = self.knowledge.lookup(message)
+        Knowledge = self.knowledge.render(matched) if matched else "(本段沒有需要特別注意的專有名詞)"
         
         prompt = f"""
     你是一個專業的翻譯員，精通繁體中文、英語、日語和德語。
@@ -80,12 +93,15 @@ class MistralAPI:
     {{"original": "原文","translation": "翻譯", "proper": ["(1) 專有名詞一：專有名詞解釋一","(2) 專有名詞二：專有名詞解釋二"]}}
     """
         
-        messages = [
+        return [
             {
                 'role': 'user',
                 'content': prompt
             }
         ]
+
+    def _translate_to_chinese(self, message, model):
+        messages = self._build_messages(message)
         
         start_time = time.time()
         
@@ -102,6 +118,57 @@ class MistralAPI:
         
         return chat_response.choices[0].message.content
 
+    def parse_translation(self, content, message, fallback_translation=""):
+        """把模型輸出解析成 original / translation / proper，JSON 格式有誤時盡量保留能用的部分"""
+        data = loads_tolerant(content or "")
+        if data is None:
+            print(f"⚠️ 無法解析翻譯結果: {content}")
+            data = {}
+        proper = data.get("proper") or []
+        if isinstance(proper, str):
+            proper = [proper]
+        return {
+            "original": data.get("original") or message,
+            "translation": data.get("translation") or fallback_translation,
+            "proper": [str(p) for p in proper],
+        }
+
+    async def translate_to_chinese_stream(self, message, model = 'mistral-large-latest', language_code = 'zh'):
+        """
+        串流翻譯：模型邊產生邊解析 JSON 中的 translation 欄位，
+        依序產生 ("partial", 目前的譯文)，最後產生 ("final", {"original", "translation", "proper"})
+        """
+        message = normalize_text(message)
+        key = self.cache.make_key(message, "auto", language_code, f"{model}:{self.knowledge_version}")
+        cached = self.cache.get(key)
+        if cached is not None:
+            yield "final", self.parse_translation(cached, message)
+            return
+
+        start_time = time.time()
+        first_token_time = None
+        translation = StreamingStringField("translation")
+        content = []
+        response = await self.client.chat.stream_async(model=model, messages=self._build_messages(message))
+        async with response as events:
+            async for event in events:
+                if not event.data.choices:
+                    continue
+                delta = event.data.choices[0].delta.content
+                if not isinstance(delta, str) or not delta:
+                    continue
+                if first_token_time is None:
+                    first_token_time = time.time()
+                content.append(delta)
+                if translation.feed(delta):
+                    yield "partial", translation.value
+
+        content = "".join(content)
+        print(f"🕒 首個 token: {(first_token_time or time.time()) - start_time} 秒, 總花費時間: {time.time() - start_time} 秒")
+        if loads_tolerant(content) is not None:
+            self.cache.put(key, content)
+        yield "final", self.parse_translation(content, message, translation.value)
+
 def main():
     # 設定 API 金鑰
     api_key = os.getenv("MISTRAL_API_KEY")
@@ -0,0 +1,119 @@
+import re
+
+SAMPLE_RATE = 16000
+
+# 尾段音訊超過這個長度還沒有穩定下來，就強制提交較早的部分，確保每次送出的音訊有上限
+MAX_TAIL_SECONDS = 20.0
+# 強制提交時保留在尾段、繼續等待確認的秒數
+FORCE_KEEP_SECONDS = 5.0
+# 送給 Whisper 當作上下文的已提交文字長度
+PROMPT_CHARS = 200
+
+_PUNCT_RE = re.compile(r"[\s\.,!?;:，。！？；：、「」『』（）()\"'…-]+")
+
+
+def _normalize(text: str) -> str:
+    return _PUNCT_RE.sub("", text).lower()
+
+
+def words_from_response(response: dict) -> list:
+    """從 Whisper 回應取出 (start, end, text) 清單，優先使用字詞時間戳，其次是片段時間戳"""
+    words = []
+    for segment in response.get("segments") or []:
+        if segment.get("words"):
+            for word in segment["words"]:
+                words.append((float(word["start"]), float(word["end"]), word.get("word", word.get("text", ""))))
+        else:
+            words.append((float(segment["start"]), float(segment["end"]), segment.get("text", "")))
+    return [w for w in words if _normalize(w[2])]
+
+
+class PartialTranscriber:
+    """
+    以 local agreement 方式累積即時辨識結果：
+    連續兩次辨識都一致的前綴才會被提交，之後只需要把尚未提交的尾段音訊送去辨識，
+    並附上已提交的文字當作上下文，每次更新的成本就不會隨錄音長度成長。
+    """
+
+    def __init__(self, sample_rate: int = SAMPLE_RATE):
+        self.sample_rate = sample_rate
+        self.committed = []  # 已提交的 (start, end, text)，時間為整段錄音的絕對秒數
+        self.committed_sample = 0  # 尚未提交的尾段從這個取樣點開始
+        self.hypothesis = []  # 上一次辨識的尾段結果，用來比對是否穩定
+        self.untimed = None  # 伺服器沒有時間戳時，上一次的尾段文字與其結尾 (text, end_sample)
+
+    @property
+    def committed_text(self) -> str:
+        return "".join(w[2] for w in self.committed).strip()
+
+    @property
+    def text(self) -> str:
+        """目前完整的暫時逐字稿 (已提交 + 尚未穩定的尾段)"""
+        if self.untimed is not None:
+            return (self.committed_text + self.untimed[0]).strip()
+        return "".join(w[2] for w in self.committed + self.hypothesis).strip()
+
+    @property
+    def prompt(self) -> str:
+        return self.committed_text[-PROMPT_CHARS:]
+
+    def update(self, response: dict, offset_sample: int, end_sample: int) -> str:
+        """
+        套用一次尾段辨識結果，回傳目前完整的暫時逐字稿 (已提交 + 尚未穩定的尾段)
+        offset_sample/end_sample 為這次送出的音訊在整段錄音中的範圍
+        """
+        offset = offset_sample / self.sample_rate
+        tail_end = end_sample / self.sample_rate
+        last_committed_time = self.committed_sample / self.sample_rate
+
+        words = words_from_response(response)
+        if not words:
+            # 伺服器沒有提供時間戳，只能在尾段過長時整段提交
+            text = response.get("text", "")
+            self.hypothesis = []
+            if tail_end - last_committed_time >= MAX_TAIL_SECONDS and _normalize(text):
+                self._commit_untimed(text, end_sample)
+                return self.committed_text
+            self.untimed = (text, end_sample) if _normalize(text) else None
+            return (self.committed_text + text).strip()
+
+        self.untimed = None
+
+        new = [(s + offset, e + offset, t) for s, e, t in words if s + offset >= last_committed_time - 0.1]
+
+        # 比對上一次的結果，提交兩次都一致的前綴
+        agreed = 0
+        while (agreed < len(new) and agreed < len(self.hypothesis)
+               and _normalize(new[agreed][2]) == _normalize(self.hypothesis[agreed][2])):
+            agreed += 1
+
+        # 尾段太長仍未穩定時，提交距離結尾 FORCE_KEEP_SECONDS 以前的字詞
+        if tail_end - last_committed_time >= MAX_TAIL_SECONDS:
+            while agreed < len(new) and new[agreed][1] <= tail_end - FORCE_KEEP_SECONDS:
+                agreed += 1
+
+        if agreed:
+            self.committed.extend(new[:agreed])
+            self.committed_sample = max(self.committed_sample, int(new[agreed - 1][1] * self.sample_rate))
+        self.hypothesis = new[agreed:]
+
+        return "".join(w[2] for w in self.committed + self.hypothesis).strip()
+
+    def _commit_untimed(self, text: str, end_sample: int):
+        self.committed.append((self.committed_sample / self.sample_rate, end_sample / self.sample_rate, text))
+        self.committed_sample = max(self.committed_sample, end_sample)
+        self.untimed = None
+
+    def commit_until(self, sample: int):
+        """在句子邊界提交：邊界之前尚未穩定的字詞直接提交，下一次從邊界開始送出"""
+        if sample <= self.committed_sample:
+            return
+        if self.untimed is not None:
+            # 沒有時間戳無法在邊界切開，整段尾段文字一起提交，下一次從這段音訊的結尾開始
+            self._commit_untimed(*self.untimed)
+            return
+        boundary = sample / self.sample_rate
+        keep = [w for w in self.hypothesis if w[1] > boundary]
+        self.committed.extend(w for w in self.hypothesis if w[1] <= boundary)
+        self.hypothesis = keep
+        self.committed_sample = sample
@@ -0,0 +1,73 @@
+import os
+import queue
+import threading
+
+import soundfile as sf
+
+# 錄音存檔格式：flac (無損，預設)、opus (有損，最小) 或 wav (原始 PCM)
+RECORDING_FORMAT = os.getenv("RECORDING_FORMAT", "flac").lower()
+
+# 格式 -> (soundfile 格式, subtype, 副檔名, MIME type)
+FORMATS = {
+    "flac": ("FLAC", "PCM_16", ".flac", "audio/flac"),
+    "opus": ("OGG", "OPUS", ".opus", "audio/ogg"),
+    "wav": ("WAV", "PCM_16", ".wav", "audio/wav"),
+}
+
+
+def resolve_format(name: str = RECORDING_FORMAT) -> str:
+    """檢查 libsndfile 是否支援指定格式，不支援時退回 flac"""
+    if name not in FORMATS:
+        print(f"⚠️ 不支援的錄音格式 {name}，改用 flac")
+        return "flac"
+    container, subtype = FORMATS[name][:2]
+    if subtype not in sf.available_subtypes(container):
+        print(f"⚠️ 這個 libsndfile 不支援 {name}，改用 flac")
+        return "flac"
+    return name
+
+
+def find_recording(base_path: str):
+    """依序尋找各格式的錄音檔，回傳 (路徑, MIME type)，都不存在時回傳 (None, None)"""
+    for _, _, extension, media_type in FORMATS.values():
+        if os.path.exists(base_path + extension):
+            return base_path + extension, media_type
+    return None, None
+
+
+class RecordingWriter:
+    """
+    邊錄邊壓縮的錄音檔：write() 只把音訊放進佇列，
+    由背景執行緒以 soundfile 串流編碼成 FLAC / Opus，不佔用事件迴圈。
+    """
+
+    def __init__(self, base_path: str, sample_rate: int = 16000, format: str = RECORDING_FORMAT):
+        self.format = resolve_format(format)
+        container, subtype, extension, self.media_type = FORMATS[self.format]
+        self.path = base_path + extension
+        self.file = sf.SoundFile(self.path, "w", samplerate=sample_rate, channels=1, format=container, subtype=subtype)
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, daemon=True, name="recording-writer")
+        self.thread.start()
+
+    def write(self, samples):
+        """samples 為 int16 numpy 陣列 (AudioStore 的 view 不會再被改寫，可直接放進佇列)"""
+        if len(samples):
+            self.queue.put(samples)
+
+    def _run(self):
+        try:
+            while True:
+                samples = self.queue.get()
+                if samples is None:
+                    break
+                self.file.write(samples)
+        except Exception as e:
+            print(f"⚠️ 寫入錄音檔失敗 ({self.path}): {e}")
+        finally:
+            self.file.close()
+
+    def close(self):
+        """寫完佇列中剩下的音訊並關閉檔案 (會阻塞，請在執行緒池中呼叫)"""
+        self.queue.put(None)
+        self.thread.join()
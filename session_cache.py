@@ -0,0 +1,101 @@
+import asyncio
+import os
+import threading
+
+from cachetools import TTLCache
+
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "10000"))
+SESSION_CACHE_TTL = float(os.getenv("SESSION_CACHE_TTL", "300"))
+# 找不到的 session 也記一小段時間，重連風暴時不會一直打到 Atlas
+SESSION_NEGATIVE_TTL = float(os.getenv("SESSION_NEGATIVE_TTL", "30"))
+
+
+class SessionStore:
+    """
+    sessions_collection (AsyncCollection) 前面的快取層：查詢結果放在 TTL/LRU 快取中，
+    不存在的 session_id 另外做短時間的負向快取；同一個 session_id 同時查詢只會打一次資料庫。
+    登入時寫入並放進快取，登出時刪除並標記為不存在。
+    有 bus 時登出會透過 bus 通知其他 worker 立即移除快取；通知遺失時最晚在 TTL 後失效。
+    """
+
+    def __init__(self, collection, maxsize: int = SESSION_CACHE_SIZE, ttl: float = SESSION_CACHE_TTL,
+                 negative_ttl: float = SESSION_NEGATIVE_TTL, bus=None):
+        self.collection = collection
+        self.bus = bus
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.missing = TTLCache(maxsize=maxsize, ttl=negative_ttl)
+        self.lock = threading.Lock()
+        self.inflight = {}  # session_id -> 查詢中的 future
+        self.hits = 0
+        self.misses = 0
+        if bus is not None:
+            bus.on_session_revoked(self.invalidate)
+
+    async def ensure_indexes(self):
+        await self.collection.create_index("session_id", unique=True)
+
+    def _lookup(self, session_id: str):
+        with self.lock:
+            if session_id in self.missing:
+                self.hits += 1
+                return True, None
+            user = self.cache.get(session_id)
+            if user is not None:
+                self.hits += 1
+                return True, dict(user)
+            return False, None
+
+    def _store(self, session_id: str, user):
+        with self.lock:
+            if user is None:
+                self.cache.pop(session_id, None)
+                self.missing[session_id] = True
+            else:
+                self.missing.pop(session_id, None)
+                self.cache[session_id] = dict(user)
+
+    async def get(self, session_id: str):
+        """回傳 session 的使用者資料 (副本)，不存在時回傳 None"""
+        found, user = self._lookup(session_id)
+        if found:
+            return user
+
+        future = self.inflight.get(session_id)
+        if future is None:
+            with self.lock:
+                self.misses += 1
+            future = self.inflight[session_id] = asyncio.ensure_future(
+                self.collection.find_one({"session_id": session_id})
+            )
+            try:
+                # 第一個呼叫端被取消時，其他等待同一個查詢的呼叫端不受影響
+                user = await asyncio.shield(future)
+                self._store(session_id, user)
+            finally:
+                self.inflight.pop(session_id, None)
+        else:
+            user = await asyncio.shield(future)
+        return dict(user) if user is not None else None
+
+    async def create(self, user: dict):
+        await self.collection.insert_one(user)
+        self._store(user["session_id"], user)
+
+    async def delete(self, session_id: str):
+        await self.collection.delete_one({"session_id": session_id})
+        self._store(session_id, None)
+        if self.bus is not None:
+            self.bus.revoke_session(session_id)
+
+    def invalidate(self, session_id: str):
+        """其他 worker 登出了這個 session"""
+        self._store(session_id, None)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "size": len(self.cache),
+                "missing": len(self.missing),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
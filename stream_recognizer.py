@@ -3,120 +3,69 @@ import asyncio
 from google.cloud import speech
 from final_recognizer import final_transcribe
 import time
-import soundfile as sf
 import numpy as np
-import requests 
 import json
 import os
-import random
 
 from translate.translate_deepl import *
-
-WHISPER_SERVER_URL = "http://10.121.240.4"
-LANGUAGE_MAP = {
-    "en-US": "en",
-    "cmn-Hant-TW": "zh",
-    "ja-JP": "ja",
-    "de-DE": "de",
-}
-
-
-async def transcript_audio(wave_path: str, language_code: str) -> str:
-    """發送音訊數據到 GPU Whisper 伺服器進行轉錄"""
-    # 創建一個臨時音訊檔案
-    # with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as temp_file:
-    #     temp_file.write(audio_data)
-    #     temp_file_path = temp_file.name
-    print(f"🔄 載入音訊: {wave_path}")
-
-    try:
-        # 設定請求參數
-        files = {"file": open(wave_path, "rb")}
-        data = {"language": LANGUAGE_MAP.get(language_code, "en")}
-        
-        print(f"🔄 發送音訊: {wave_path} 進行辨識...")
-
-        # 發送 POST 請求到 Whisper 伺服器
-        response = requests.post(f"{WHISPER_SERVER_URL}{random.randint(0, 1)}:876{random.randint(0, 3)}/transcribe", files=files, data=data)
-        
-        print(f"🔄 Whisper 伺服器回應: {response}")
-
-        if response.status_code == 200:
-            return response.json().get("text", "Transcription failed")
-        else:
-            return f"Error: {response.status_code} - {response.text}"
-    except Exception as e:
-        return f"Exception: {str(e)}"
+from translate.delta_translation import DeltaTranslator
+from translate.translation_dispatcher import TranslationDispatcher
+from partial_transcriber import PartialTranscriber
+from audio_store import AudioStore
+from vad import SpeechSegmenter
+from whisper_client import get_whisper_client, LANGUAGE_MAP
+
+# 暫時辨識的更新間隔會依最近的 Whisper + 翻譯延遲調整，並限制在這個範圍內
+MIN_UPDATE_INTERVAL = 0.5
+MAX_UPDATE_INTERVAL = 4.0
+# 距離上次送出至少要有這麼多新音訊才值得再送一次
+MIN_NEW_AUDIO_SECONDS = 0.3
 
 class StreamRecognizer:
-    def __init__(self, language_code: str, loop, broadcast_clients, message_id, name, language, translator):
+    def __init__(self, language_code: str, loop, broadcaster, message_id, name, language, translator, audio_store=None, whisper_client=None, translation_dispatcher=None):
         self.language_code = language_code
         self.loop = loop
-        self.broadcast_clients = broadcast_clients  # 這是會議內部的 clients
+        self.broadcaster = broadcaster  # 會議的廣播器
         self.audio_queue = queue.Queue()
         self.is_running = True
         self.message_id = message_id
         self.name = name
         self.language = language
-        self.full_audio_buffer = []  # 儲存所有音訊數據
+        self.audio_store = audio_store if audio_store is not None else AudioStore()  # 與錄音共用的音訊緩衝區
+        self.whisper_client = whisper_client or get_whisper_client()
+        self.partial = PartialTranscriber()  # 已提交的前綴與尚未穩定的尾段
+        self.segmenter = SpeechSegmenter()  # VAD 標記的語音片段
         self.last_update_time = time.time()
+        self.update_inflight = False  # 同一時間最多只有一個暫時辨識在處理
+        self.update_latency = 1.0  # 暫時辨識 + 翻譯延遲的 EWMA (秒)
+        self.last_sent_sample = 0  # 上一次送出的音訊結尾
         self.loop = asyncio.get_event_loop()
         self.translator = translator
+        # 翻譯請求交給派送器，與其他講者的句子合併成批次，並在事件迴圈之外執行
+        if translation_dispatcher is None and translator is not None:
+            translation_dispatcher = TranslationDispatcher(translator)
+        self.delta_translator = DeltaTranslator(translation_dispatcher.translate_many) if translation_dispatcher else None
 
-    async def broadcast_transcript(self, transcript: str, is_final: bool):
-        """只對當前會議的 clients 廣播轉錄結果"""
-        # message = f"temp:{transcript}"
-        print(transcript)
-        message = {
+    def _message(self, text: str, label: str) -> dict:
+        return {
             "id": self.message_id,
-            "message": transcript,
+            "message": text,
             "name": self.name,
             "language": self.language,
             "status": "temp",
-            "label": "transcript"
+            "label": label
         }
-        
-        print(f"廣播訊息: {message}")
-        
-        to_remove = []
-        for client in self.broadcast_clients:
-            try:
-                await client.send_json(message)
-            except Exception as e:
-                print(f"廣播失敗: {e}")
-                to_remove.append(client)
 
-        # 移除已斷線的客戶端
-        for client in to_remove:
-            self.broadcast_clients.remove(client)
-            
-    async def broadcast_translate(self, translate: str, is_final: bool):
+    async def broadcast_transcript(self, transcript: str, is_final: bool):
         """只對當前會議的 clients 廣播轉錄結果"""
-        # message = f"temp:{translate}"
-        print(translate)
-        message = {
-            "id": self.message_id,
-            "message": translate,
-            "name": self.name,
-            "language": self.language,
-            "status": "temp",
-            "label": "translate"
-        }
-        
-        print(f"廣播訊息: {message}")
-        
-        to_remove = []
-        for client in self.broadcast_clients:
-            try:
-                await client.send_json(message)
-            except Exception as e:
-                print(f"廣播失敗: {e}")
-                to_remove.append(client)
+        print(f"廣播訊息: {transcript}")
+        self.broadcaster.publish(self._message(transcript, "transcript"))
+
+    async def broadcast_translate(self, translate: str, is_final: bool):
+        """只對當前會議的 clients 廣播翻譯結果"""
+        print(f"廣播訊息: {translate}")
+        self.broadcaster.publish(self._message(translate, "translate"))
 
-        # 移除已斷線的客戶端
-        for client in to_remove:
-            self.broadcast_clients.remove(client)
-        
     # async def broadcast_transcript(self, transcript: str, is_final: bool):
     #     """只對當前會議的 clients 廣播轉錄結果"""
     #     # message = f"temp:{translate}"
@@ -165,11 +114,11 @@ class StreamRecognizer:
                     if chunk is None:  # 結束訊號
                         break
                     
-                    self.full_audio_buffer.append(chunk)  # 累積音訊數據
+                    # 音訊已由錄音端寫入共用的 audio_store
                     # yield speech.StreamingRecognizeRequest(audio_content=chunk)
 
-                    # 每 0.5 秒鐘更新一次翻譯
-                    if time.time() - self.last_update_time >= 1:
+                    # 上一次更新完成後，依延遲與新音訊量決定是否再更新
+                    if self.should_update():
                         self.last_update_time = time.time()
                         self.updateTranslate()
                     
@@ -201,62 +150,94 @@ class StreamRecognizer:
         except Exception as e:
             print(f"串流辨識發生錯誤: {e}")
             
+    def should_update(self) -> bool:
+        """
+        單一請求：前一次暫時辨識還沒完成時不送新的，新音訊會併入下一次請求。
+        更新間隔跟著實際延遲調整，新音訊太少時也先不送。
+        """
+        if self.update_inflight:
+            return False
+        interval = min(max(self.update_latency, MIN_UPDATE_INTERVAL), MAX_UPDATE_INTERVAL)
+        new_audio = (len(self.audio_store) - self.last_sent_sample) / self.audio_store.sample_rate
+        if new_audio < MIN_NEW_AUDIO_SECONDS:
+            return False
+        # 累積的新音訊已超過一個間隔時不必再等，盡快追上
+        return time.time() - self.last_update_time >= interval or new_audio >= 2 * interval
+
     def updateTranslate(self):
-        """將累積的音訊寫入暫存檔並傳遞給翻譯系統"""
+        """只把尚未提交的尾段音訊傳遞給翻譯系統"""
         try:
-            if not self.full_audio_buffer:
+            if len(self.audio_store) == 0:
                 print("⚠️ 沒有可用的音訊數據，跳過 updateTranslate")
                 return
             
-            # 將所有累積的音訊轉換為 NumPy 陣列
-            audio_data = np.concatenate([np.frombuffer(chunk, dtype=np.int16) for chunk in self.full_audio_buffer])
-
-            temp_wav_path = "temp_audio.wav"
-
-            # 確保音訊存為 16kHz 16-bit PCM WAV 格式
-            sf.write(temp_wav_path, audio_data, samplerate=16000, subtype="PCM_16")
-            print(f"🎙️ 更新翻譯，音訊已存入: {temp_wav_path}")
+            # 只取出尚未提交的尾段，已提交的部分不再重複送出
+            offset_sample = self.partial.committed_sample
+            ranges = self.segmenter.speech_ranges(offset_sample, len(self.audio_store))
+            if not ranges:
+                # 尾段都是靜音，不需要送 Whisper
+                return
+            # 去掉尾段前後的靜音 (仍是零複製 view)
+            start_sample, end_sample = ranges[0][0], ranges[-1][1]
+            audio_data = self.audio_store.view(start_sample, end_sample)
+            boundary = self.segmenter.last_boundary(offset_sample)
+            print(f"🎙️ 更新翻譯，尾段音訊: {start_sample} ~ {end_sample}")
+            self.last_sent_sample = end_sample
+            self.update_inflight = True
 
             # 使用 asyncio 讓 updateTranslate 可以在事件迴圈內運行
             asyncio.run_coroutine_threadsafe(
-                self.send_audio_to_translation(temp_wav_path),
+                self.send_audio_to_translation(audio_data, start_sample, end_sample, boundary),
                 self.loop
             )
 
         except Exception as e:
+            self.update_inflight = False
             print(f"⚠️ 更新翻譯時發生錯誤: {e}")
 
 
-    async def send_audio_to_translation(self, wav_path):
-        """模擬發送音檔到翻譯系統 (這裡你需要替換成你的翻譯 API 呼叫)"""
-        print(f"🔄 送出音訊: {wav_path} 進行翻譯...")
+    async def send_audio_to_translation(self, audio_data, offset_sample, end_sample, boundary=None):
+        """送出尾段音訊辨識，合併已提交的文字後廣播並翻譯；boundary 為 VAD 找到的句子邊界"""
         start_time = time.time()
-        # 這裡可以加上 HTTP POST 請求到翻譯系統
-        # 例如: await send_to_translation_server(wav_path)
-        temp_text = await transcript_audio(wav_path, self.language_code)
-        # temp_text = await self.loop.run_in_executor(None, transcript_audio, wav_path, self.language_code)
-        print("🔄 暫時辨識結果: ", temp_text)
-        await self.broadcast_transcript(temp_text, True)
-        
-        # processed_temp_data = await translate_to_chinese(temp_text)
-        print(self.translator.translate_to_chinese, temp_text, self.language_code)
-        processed_temp_data = self.translator.translate_to_chinese(
-            temp_text, LANGUAGE_MAP.get(self.language_code, "en-US").upper()
-        ) if self.language_code != "cmn-Hant-TW" else temp_text
-
-        print(f"🔄 翻譯結果: {processed_temp_data}")
-        # processed_temp_data = json.loads(processed_temp_data)
-        # processed_temp_translated_text = processed_temp_data["translation"]
-        
-        # print(f"🔄 暫時翻譯結果: {processed_temp_data}")
-        await self.broadcast_translate(processed_temp_data, True)
-        
-        await seript(processed_temp_data, True)
-        print(f"🕒 暫時翻譯花費時間: {time.time() - start_time} 秒")
+        try:
+            result = await self.whisper_client.transcribe(audio_data, self.language_code, self.partial.prompt)
+            if result.get("error"):
+                print("⚠️ 暫時辨識失敗: ", result.get("text"))
+                return
+            if not self.is_running:
+                # 錄音已結束，最終結果會取代暫時結果
+                return
+            temp_text = self.partial.update(result, offset_sample, end_sample)
+            if boundary is not None:
+                # 一句話已經說完，直接在邊界提交，不必等下一次結果確認
+                self.partial.commit_until(boundary)
+            print("🔄 暫時辨識結果: ", temp_text)
+            await self.broadcast_transcript(temp_text, True)
+            
+            # processed_temp_data = await translate_to_chinese(temp_text)
+            # 只翻譯新增或改變的句子，其餘沿用上一次的譯文
+            processed_temp_data = await self.delta_translator.translate(
+                temp_text, LANGUAGE_MAP.get(self.language_code, "en-US").upper()
+            ) if self.language_code != "cmn-Hant-TW" else temp_text
+
+            print(f"🔄 翻譯結果: {processed_temp_data}")
+            # processed_temp_data = json.loads(processed_temp_data)
+            # processed_temp_translated_text = processed_temp_data["translation"]
+            
+            # print(f"🔄 暫時翻譯結果: {processed_temp_data}")
+            if self.is_running:
+                await self.broadcast_translate(processed_temp_data, True)
+            
+            elapsed = time.time() - start_time
+            self.update_latency = 0.7 * self.update_latency + 0.3 * elapsed
+            print(f"🕒 暫時翻譯花費時間: {elapsed} 秒")
+        finally:
+            self.update_inflight = False
         
 
     def add_audio_data(self, audio_chunk):
-        """加入音訊資料到佇列"""
+        """標記新音訊中的語音片段並通知辨識執行緒 (音訊本身由呼叫端寫入 audio_store)"""
+        self.segmenter.feed(audio_chunk)
         self.audio_queue.put(audio_chunk)
 
     def stop(self):
@@ -0,0 +1,217 @@
+import asyncio
+import contextlib
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from cachetools import LRUCache
+
+# 同時進行的摘要數上限，與排隊等待的上限；超過時直接回絕，避免拖慢即時轉錄
+SUMMARY_CONCURRENCY = int(os.getenv("SUMMARY_CONCURRENCY", "2"))
+SUMMARY_MAX_WAITING = int(os.getenv("SUMMARY_MAX_WAITING", "8"))
+# 會議紀錄每幾筆切成一段做摘要；段落邊界固定，已完成的段落重新摘要時可以直接用快取
+SUMMARY_CHUNK_RECORDS = int(os.getenv("SUMMARY_CHUNK_RECORDS", "40"))
+SUMMARY_CACHE_DIR = "summaries"
+# 記憶體中保留的摘要數，其餘仍可從 summaries/ 目錄讀回
+SUMMARY_CACHE_SIZE = int(os.getenv("SUMMARY_CACHE_SIZE", "256"))
+
+
+class SummarizerBusy(Exception):
+    pass
+
+
+def build_summary_prompt(meeting_text: str) -> str:
+    return f"""
+    你是一個專業的筆記整理助理，請根據以下的逐字稿，撰寫中文為主的摘要並以 Markdown 格式輸出：
+
+    ```
+    {meeting_text}
+    ```
+
+    ## 格式要求：
+    - 使用 **標題** 來區分不同議題
+    - 以 **條列清單** 方式整理重點
+    - 重要資訊請用 **加粗**
+    """
+
+
+def build_chunk_prompt(chunk_text: str) -> str:
+    return f"""
+    你是一個專業的筆記整理助理，以下是一場會議其中一段的逐字稿 (格式為「發言者: 內容」)，
+    請用繁體中文條列這一段討論的重點、決議與待辦事項，保留專有名詞與人名，不要加入逐字稿中沒有的內容：
+
+    ```
+    {chunk_text}
+    ```
+    """
+
+
+def build_reduce_prompt(chunk_summaries: list) -> str:
+    sections = "\n\n".join(f"### 第 {i + 1} 段\n{summary}" for i, summary in enumerate(chunk_summaries))
+    return f"""
+    你是一個專業的筆記整理助理，以下是同一場會議依時間順序分段整理的重點，
+    請整合成一份完整的中文會議摘要並以 Markdown 格式輸出，合併重複的內容：
+
+    {sections}
+
+    ## 格式要求：
+    - 使用 **標題** 來區分不同議題
+    - 以 **條列清單** 方式整理重點
+    - 重要資訊請用 **加粗**
+    """
+
+
+def load_meeting_records(path: str) -> list:
+    records = []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+    except FileNotFoundError:
+        pass
+    return records
+
+
+class MeetingSummarizer:
+    """
+    在專用的執行緒池中呼叫 Gemini 的串流生成，
+    透過 asyncio.Queue 把每個片段交回事件迴圈，不會卡住其他 websocket。
+    """
+
+    def __init__(self, model, concurrency: int = SUMMARY_CONCURRENCY, max_waiting: int = SUMMARY_MAX_WAITING):
+        self.model = model
+        self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="summarize")
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.max_waiting = max_waiting
+        self.waiting = 0
+        self.cache = LRUCache(maxsize=SUMMARY_CACHE_SIZE)  # prompt 雜湊 -> 摘要
+        os.makedirs(SUMMARY_CACHE_DIR, exist_ok=True)
+
+    def admit(self):
+        """每個摘要請求只檢查一次排隊上限"""
+        if self.waiting >= self.max_waiting:
+            raise SummarizerBusy("目前摘要請求過多，請稍後再試")
+
+    @contextlib.contextmanager
+    def request(self):
+        """分段摘要的整個請求 (map + reduce) 期間都計入等待數，內部各次呼叫不再另外計算"""
+        self.admit()
+        self.waiting += 1
+        try:
+            yield
+        finally:
+            self.waiting -= 1
+
+    async def stream(self, prompt: str, admit: bool = True):
+        """
+        逐段產生摘要的 Markdown 文字；
+        admit=False 用於已通過檢查的請求內部的多次呼叫 (例如 map 階段的各段)，直接排隊等待，不計入等待數
+        """
+        if admit:
+            self.admit()
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+
+        def generate():
+            try:
+                for chunk in self.model.generate_content(prompt, stream=True):
+                    try:
+                        text = chunk.text
+                    except ValueError:
+                        # 被安全過濾或沒有文字的片段
+                        continue
+                    if text:
+                        loop.call_soon_threadsafe(queue.put_nowait, ("chunk", text))
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, ("error", e))
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, ("done", None))
+
+        if admit:
+            self.waiting += 1
+        try:
+            await self.semaphore.acquire()
+        finally:
+            if admit:
+                self.waiting -= 1
+        try:
+            loop.run_in_executor(self.executor, generate)
+            while True:
+                kind, value = await queue.get()
+                if kind == "chunk":
+                    yield value
+                elif kind == "error":
+                    raise value
+                else:
+                    break
+        finally:
+            self.semaphore.release()
+
+    async def summarize(self, prompt: str, admit: bool = True) -> str:
+        return "".join([chunk async for chunk in self.stream(prompt, admit)])
+
+    def _cache_path(self, key: str) -> str:
+        return f"{SUMMARY_CACHE_DIR}/{key}.md"
+
+    def _read_cache(self, key: str):
+        try:
+            with open(self._cache_path(key), "r", encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _write_cache(self, key: str, text: str):
+        with open(self._cache_path(key), "w", encoding="utf-8") as f:
+            f.write(text)
+
+    async def summarize_cached(self, prompt: str, admit: bool = True) -> str:
+        """以 prompt 內容雜湊快取摘要結果 (記憶體 + summaries/ 目錄)"""
+        key = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        if key in self.cache:
+            return self.cache[key]
+        loop = asyncio.get_running_loop()
+        text = await loop.run_in_executor(None, self._read_cache, key)
+        if text is None:
+            text = await self.summarize(prompt, admit)
+            if text:
+                await loop.run_in_executor(None, self._write_cache, key, text)
+        self.cache[key] = text
+        return text
+
+    async def map_meeting(self, log_path: str) -> list:
+        """
+        map 階段：把會議紀錄切成固定筆數的段落並行摘要，回傳各段摘要；
+        內容沒變的段落直接命中快取，會議新增發言後只有新的段落需要重新摘要；
+        呼叫端需在 request() 中呼叫，各段落直接在 semaphore 上排隊，段數多的長會議也能完成
+        """
+        loop = asyncio.get_running_loop()
+        records = await loop.run_in_executor(None, load_meeting_records, log_path)
+        chunks = [records[i:i + SUMMARY_CHUNK_RECORDS] for i in range(0, len(records), SUMMARY_CHUNK_RECORDS)]
+        prompts = [
+            build_chunk_prompt("\n".join(f"{r.get('name', 'Unknown')}: {r.get('message', '')}" for r in chunk))
+            for chunk in chunks
+        ]
+        return await asyncio.gather(*(self.summarize_cached(prompt, admit=False) for prompt in prompts))
+
+    async def stream_meeting(self, log_path: str):
+        """reduce 階段以串流方式產生最終 Markdown；只有一段時直接回傳該段摘要"""
+        with self.request():
+            summaries = [s for s in await self.map_meeting(log_path) if s]
+            if not summaries:
+                return
+            if len(summaries) == 1:
+                yield summaries[0]
+                return
+            async for chunk in self.stream(build_reduce_prompt(summaries), admit=False):
+                yield chunk
+
+    async def summarize_meeting(self, log_path: str) -> str:
+        with self.request():
+            summaries = [s for s in await self.map_meeting(log_path) if s]
+            if len(summaries) <= 1:
+                return summaries[0] if summaries else ""
+            return await self.summarize_cached(build_reduce_prompt(summaries), admit=False)
@@ -0,0 +1,41 @@
+import re
+from collections import OrderedDict
+
+from translate.translation_cache import normalize_text
+
+# 中日文句末標點直接切；英文句點後面要接空白才切，避免切到 3.14、e.g. 之類的縮寫
+_SENTENCE_SPLIT_RE = re.compile(r"(?<=[。！？!?])\s*|(?<=[.;])\s+")
+
+
+def split_sentences(text: str) -> list:
+    return [sentence for sentence in _SENTENCE_SPLIT_RE.split(normalize_text(text)) if sentence]
+
+
+class DeltaTranslator:
+    """
+    以句子為單位翻譯持續變長的暫時逐字稿：
+    已經翻譯過且內容沒變的句子直接沿用，只有新增或被修改的句子會送到上游，
+    廣播用的譯文再由各句的結果組回來。
+    """
+
+    def __init__(self, translate_many, max_sentences: int = 512):
+        self.translate_many = translate_many  # async translate_many(texts, source_lang) -> list
+        self.max_sentences = max_sentences
+        self.sentences = OrderedDict()  # (source_lang, 句子) -> 譯文
+
+    async def translate(self, text: str, source_lang: str) -> str:
+        sentences = split_sentences(text)
+        missing = [s for s in dict.fromkeys(sentences) if (source_lang, s) not in self.sentences]
+        if missing:
+            for sentence, translated in zip(missing, await self.translate_many(missing, source_lang)):
+                self.sentences[(source_lang, sentence)] = translated
+
+        # 目標語言為中文，句子之間不需要空白
+        translated = "".join(self.sentences[(source_lang, sentence)] for sentence in sentences)
+
+        # 只淘汰這次沒用到的舊句子
+        for sentence in sentences:
+            self.sentences.move_to_end((source_lang, sentence))
+        while len(self.sentences) > max(self.max_sentences, len(sentences)):
+            self.sentences.popitem(last=False)
+        return translated
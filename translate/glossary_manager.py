@@ -0,0 +1,123 @@
+import contextlib
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import fcntl
+except ImportError:  # Windows 上只有單一 worker，不需要跨行程的檔案鎖
+    fcntl = None
+
+from translate.translation_cache import content_version
+
+TARGET_LANG = "ZH-HANT"
+GLOSSARY_FILES = {
+    "EN": "./translate/EN_2_ZH_glossary.csv",
+    "JA": "./translate/JA_2_ZH_glossary.csv",
+    "DE": "./translate/DE_2_ZH_glossary.csv",
+}
+GLOSSARY_PREFIX = "ICSD"
+# 同一台機器上的多個 worker 啟動時輪流檢查 / 建立詞彙表，避免同時建立同名的詞彙表
+GLOSSARY_LOCK_PATH = os.path.join(tempfile.gettempdir(), "icsd-glossary.lock")
+
+
+def read_glossary_csv(file_path: str) -> dict:
+    glossary = {}
+    with open(file_path, mode="r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line == "source,target":
+                continue
+            source, target = line.split(",", 1)
+            glossary[source] = target
+    return glossary
+
+
+def _base_lang(code) -> str:
+    return str(code).lower().split("-")[0]
+
+
+def _age_key(glossary):
+    """依建立時間由舊到新排序，時間相同時以 id 決定，每個 worker 都會選到同一份"""
+    created = getattr(glossary, "creation_time", None)
+    return (created.timestamp() if created is not None else float("inf"), str(glossary.glossary_id))
+
+
+@contextlib.contextmanager
+def _file_lock(path: str):
+    if fcntl is None:
+        yield
+        return
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        yield
+
+
+class GlossaryManager:
+    """
+    依 CSV 內容雜湊管理 DeepL 詞彙表：
+    詞彙表名稱帶有內容雜湊，啟動時先列出帳號上既有的詞彙表，雜湊相同就直接沿用，
+    只有內容改變的語言才會重新建立，並刪掉同語言的舊版本，不會每次重啟都多留一份。
+    多個 worker 以檔案鎖輪流處理；不同機器同時建立而多出的同名詞彙表，保留最舊的一份，其餘刪除。
+    """
+
+    def __init__(self, translator, target_lang: str = TARGET_LANG, prefix: str = GLOSSARY_PREFIX):
+        self.translator = translator
+        self.target_lang = target_lang
+        self.prefix = prefix
+
+    def glossary_name(self, source_lang: str, version: str) -> str:
+        return f"{self.prefix} {source_lang} Glossary {version}"
+
+    def ensure(self, files: dict = None, prune: bool = True):
+        """
+        確保每個語言都有對應目前 CSV 內容的詞彙表，回傳 (glossaries, versions)，
+        兩者皆以來源語言為 key，各語言同時處理
+        """
+        files = files or GLOSSARY_FILES
+        with _file_lock(GLOSSARY_LOCK_PATH):
+            return self._ensure(files, prune)
+
+    def _ensure(self, files: dict, prune: bool):
+        existing = self.translator.list_glossaries()
+
+        def ensure_one(source_lang):
+            entries = read_glossary_csv(files[source_lang])
+            version = content_version(entries)
+            name = self.glossary_name(source_lang, version)
+            matches = sorted((
+                glossary for glossary in existing
+                if glossary.name == name
+                and _base_lang(glossary.source_lang) == _base_lang(source_lang)
+                and _base_lang(glossary.target_lang) == _base_lang(self.target_lang)
+            ), key=_age_key)
+            ready = [glossary for glossary in matches if glossary.ready]
+            if ready:
+                print(f"✅ 沿用 DeepL 詞彙表: {name}")
+                glossary_info = ready[0]
+            else:
+                print(f"🔄 建立 DeepL 詞彙表: {name}")
+                glossary_info = self.translator.create_glossary(name, source_lang, self.target_lang, entries)
+
+            if prune:
+                # 同語言、不同內容的舊版本 (以及早期沒有雜湊的 "EN Glossary" 等) 一併清掉，
+                # 同名的重複詞彙表只留下正在使用的那一份
+                stale_names = {f"{source_lang} Glossary"}
+                for glossary in existing:
+                    is_old_version = glossary.name.startswith(f"{self.prefix} {source_lang} Glossary ") and glossary.name != name
+                    is_duplicate = glossary in matches and glossary.glossary_id != glossary_info.glossary_id
+                    if is_old_version or is_duplicate or glossary.name in stale_names:
+                        try:
+                            self.translator.delete_glossary(glossary)
+                            print(f"🗑️ 刪除舊的 DeepL 詞彙表: {glossary.name}")
+                        except Exception as e:
+                            print(f"⚠️ 刪除詞彙表失敗: {glossary.name} {e}")
+            return glossary_info, version
+
+        languages = list(files)
+        with ThreadPoolExecutor(max_workers=len(languages)) as executor:
+            results = list(executor.map(ensure_one, languages))
+
+        glossaries = {lang: result[0] for lang, result in zip(languages, results)}
+        versions = {lang: result[1] for lang, result in zip(languages, results)}
+        return glossaries, versions
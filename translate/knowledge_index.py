@@ -0,0 +1,170 @@
+import os
+import re
+import unicodedata
+from collections import deque
+from difflib import SequenceMatcher
+
+KNOWLEDGE_PATH = "./translate/cmn-Hant-TW.txt"
+# 已知的誤辨識寫法，每行：專有名詞<TAB>變體一,變體二
+VARIANTS_PATH = "./translate/cmn-Hant-TW.variants.txt"
+
+# 讀音鍵相同之外，拼寫也要至少這麼接近才算命中 (避免 route 比對到 ratio、road、red)
+PHONETIC_MIN_SIMILARITY = 0.75
+
+_SPACE_RE = re.compile(r"\s+")
+_WORD_RE = re.compile(r"[a-z][a-z0-9]*")
+_CAMEL_RE = re.compile(r"(?<=[a-z])(?=[A-Z])")
+
+
+def normalize(text: str) -> str:
+    return _SPACE_RE.sub(" ", unicodedata.normalize("NFKC", text)).strip().lower()
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isascii() and ch.isalnum()
+
+
+def phonetic_key(word: str) -> str:
+    """簡化版的 Soundex：保留首字母，其餘子音依發音分組，去掉母音與重複，用來找讀音相近的英文詞"""
+    groups = {"bfpv": "1", "cgjkqsxz": "2", "dt": "3", "l": "4", "mn": "5", "r": "6"}
+    codes = {ch: code for letters, code in groups.items() for ch in letters}
+    word = word.lower()
+    key = word[:1]
+    last = codes.get(key, "")
+    for ch in word[1:]:
+        code = codes.get(ch, "")
+        if code and code != last:
+            key += code
+        last = code
+    return key
+
+
+class AhoCorasick:
+    """多字串比對自動機，一次掃描文字就能找出所有出現的詞"""
+
+    def __init__(self):
+        self.goto = [{}]
+        self.fail = [0]
+        self.outputs = [[]]
+
+    def add(self, pattern: str, value):
+        state = 0
+        for ch in pattern:
+            if ch not in self.goto[state]:
+                self.goto.append({})
+                self.fail.append(0)
+                self.outputs.append([])
+                self.goto[state][ch] = len(self.goto) - 1
+            state = self.goto[state][ch]
+        self.outputs[state].append((len(pattern), value))
+
+    def build(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self.goto[state].items():
+                queue.append(nxt)
+                f = self.fail[state]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+                self.outputs[nxt] = self.outputs[nxt] + self.outputs[self.fail[nxt]]
+
+    def search(self, text: str):
+        """產生 (起點, 終點, value)"""
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(ch, 0)
+            for length, value in self.outputs[state]:
+                yield i - length + 1, i + 1, value
+
+
+class KnowledgeIndex:
+    """
+    專有名詞知識庫的索引：啟動時載入一次，
+    以 Aho-Corasick 比對專有名詞本身與常見誤辨識寫法，另外用讀音鍵找發音相近的英文詞，
+    每段逐字稿只挑出真正相關的條目放進 prompt。
+    """
+
+    def __init__(self, header: str, entries: list, variants: dict = None):
+        self.header = header
+        self.entries = entries  # [(專有名詞, 原始資料列)]
+        self.matcher = AhoCorasick()
+        self.phonetic = {}  # 讀音鍵 -> 條目索引
+        self.phonetic_terms = {}  # 條目索引 -> 小寫英文詞 (以空白分隔)
+        self.variants = variants = variants or {}
+
+        for index, (term, _) in enumerate(entries):
+            for pattern in self._patterns(term) | {normalize(v) for v in variants.get(term, [])}:
+                if pattern:
+                    self.matcher.add(pattern, index)
+            words = _WORD_RE.findall(normalize(term))
+            # 太短的縮寫讀音鍵太容易撞到，只替較長的英文詞建讀音索引
+            if words and len("".join(words)) >= 5:
+                self.phonetic.setdefault(" ".join(phonetic_key(w) for w in words), set()).add(index)
+                self.phonetic_terms[index] = " ".join(words)
+        self.matcher.build()
+
+    @staticmethod
+    def _patterns(term: str) -> set:
+        term = term.strip()
+        patterns = {normalize(term)}
+        patterns.add(normalize(term).replace(" ", ""))
+        patterns.add(normalize(_CAMEL_RE.sub(" ", term)))  # BigQuery -> big query
+        patterns.add(normalize(term.replace("/", " ")))
+        patterns.add(normalize(term.replace("/", "")))
+        if term.isascii() and term.isupper() and term.isalpha() and len(term) <= 5:
+            patterns.add(" ".join(term.lower()))  # GKE -> g k e
+        return patterns
+
+    @classmethod
+    def from_file(cls, path: str = KNOWLEDGE_PATH, variants_path: str = VARIANTS_PATH):
+        with open(path, "r", encoding="utf-8") as f:
+            lines = [line.rstrip("\n") for line in f if line.strip()]
+        header, rows = lines[0], lines[1:]
+        entries = []
+        for row in rows:
+            columns = row.split("\t")
+            if len(columns) >= 2:
+                entries.append((columns[1].strip(), row))
+
+        variants = {}
+        if variants_path and os.path.exists(variants_path):
+            with open(variants_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if "\t" in line and not line.startswith("#"):
+                        term, values = line.rstrip("\n").split("\t", 1)
+                        variants[term.strip()] = [v.strip() for v in values.split(",") if v.strip()]
+        return cls(header, entries, variants)
+
+    def lookup(self, text: str) -> list:
+        """回傳逐字稿中出現 (或讀音相近) 的條目索引，依知識庫順序排列"""
+        text = normalize(text)
+        found = set()
+        for start, end, index in self.matcher.search(text):
+            # 英文詞要在字詞邊界上，避免 EC 比對到 ECS 或 check
+            if start > 0 and _is_word_char(text[start - 1]) and _is_word_char(text[start]):
+                continue
+            if end < len(text) and _is_word_char(text[end]) and _is_word_char(text[end - 1]):
+                continue
+            found.add(index)
+
+        if self.phonetic:
+            words = _WORD_RE.findall(text)
+            keys = [phonetic_key(w) for w in words]
+            for n in (1, 2, 3):
+                for i in range(len(keys) - n + 1):
+                    candidates = self.phonetic.get(" ".join(keys[i:i + n]), ())
+                    if not candidates:
+                        continue
+                    phrase = " ".join(words[i:i + n])
+                    for index in candidates:
+                        if SequenceMatcher(None, phrase, self.phonetic_terms[index]).ratio() >= PHONETIC_MIN_SIMILARITY:
+                            found.add(index)
+        return sorted(found)
+
+    def render(self, indexes: list) -> str:
+        """把條目組回與知識庫相同的表格格式"""
+        return "\n".join([self.header] + [self.entries[i][1] for i in indexes])
@@ -0,0 +1,56 @@
+import threading
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+
+class LocalTranslator:
+    """
+    deepl.Translator 的本機替身，只實作詞彙表與 translate_text 這幾個會用到的介面，
+    不需要 API 金鑰也不連網路：翻譯結果是把詞彙表中的詞替換後原樣傳回。
+    用於離線開發與測試 DeeplTranslator / GlossaryManager。
+    """
+
+    def __init__(self):
+        self.glossaries = {}
+        self.calls = {"list_glossaries": 0, "create_glossary": 0, "delete_glossary": 0, "translate_text": 0}
+        self._lock = threading.Lock()
+
+    def list_glossaries(self):
+        with self._lock:
+            self.calls["list_glossaries"] += 1
+            return list(self.glossaries.values())
+
+    def create_glossary(self, name, source_lang, target_lang, entries):
+        glossary = SimpleNamespace(
+            glossary_id=str(uuid.uuid4()),
+            name=name,
+            source_lang=str(source_lang).lower(),
+            target_lang=str(target_lang).lower().split("-")[0],
+            entry_count=len(entries),
+            entries=dict(entries),
+            ready=True,
+            creation_time=datetime.now(timezone.utc),
+        )
+        with self._lock:
+            self.calls["create_glossary"] += 1
+            self.glossaries[glossary.glossary_id] = glossary
+        return glossary
+
+    def delete_glossary(self, glossary):
+        glossary_id = getattr(glossary, "glossary_id", glossary)
+        with self._lock:
+            self.calls["delete_glossary"] += 1
+            self.glossaries.pop(glossary_id, None)
+
+    def translate_text(self, text, source_lang=None, target_lang=None, glossary=None, **kwargs):
+        with self._lock:
+            self.calls["translate_text"] += 1
+        texts = [text] if isinstance(text, str) else list(text)
+        entries = getattr(glossary, "entries", {}) if glossary is not None else {}
+        results = []
+        for item in texts:
+            for source, target in entries.items():
+                item = item.replace(source, target)
+            results.append(SimpleNamespace(text=item, detected_source_lang=source_lang))
+        return results[0] if isinstance(text, str) else results
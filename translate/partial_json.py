@@ -0,0 +1,110 @@
+import json
+import re
+
+_ESCAPES = {"n": "\n", "t": "\t", "r": "\r", "b": "\b", "f": "\f"}
+_FENCE_RE = re.compile(r"^```(?:json)?\s*|\s*```$")
+
+
+class StreamingStringField:
+    """
+    從逐 token 送達的 JSON 文字中，邊收邊解出某個字串欄位的值 (例如 "translation")，
+    不需要等整個 JSON 完成；每次 feed() 回傳這次新解出的文字。
+    """
+
+    def __init__(self, field: str):
+        self.key_re = re.compile(r'"%s"\s*:\s*"' % re.escape(field))
+        self.buffer = ""
+        self.pos = None  # 字串值中下一個要解析的位置
+        self.value = ""
+        self.done = False
+
+    def feed(self, chunk: str) -> str:
+        self.buffer += chunk
+        if self.done:
+            return ""
+        if self.pos is None:
+            match = self.key_re.search(self.buffer)
+            if not match:
+                return ""
+            self.pos = match.end()
+
+        out = []
+        buf = self.buffer
+        pos = self.pos
+        while pos < len(buf):
+            ch = buf[pos]
+            if ch == '"':
+                self.done = True
+                break
+            if ch == "\\":
+                if pos + 1 >= len(buf):
+                    break  # 跳脫序列還沒收完整，等下一段
+                esc = buf[pos + 1]
+                if esc == "u":
+                    if pos + 6 > len(buf):
+                        break
+                    try:
+                        out.append(chr(int(buf[pos + 2:pos + 6], 16)))
+                    except ValueError:
+                        out.append(buf[pos:pos + 6])
+                    pos += 6
+                else:
+                    out.append(_ESCAPES.get(esc, esc))
+                    pos += 2
+                continue
+            out.append(ch)
+            pos += 1
+        self.pos = pos
+        delta = "".join(out)
+        self.value += delta
+        return delta
+
+
+def _close_json(text: str) -> str:
+    """補上被截斷的字串與括號，讓不完整的 JSON 也能解析"""
+    stack = []
+    in_string = False
+    escaped = False
+    for ch in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]" and stack:
+            stack.pop()
+    if escaped:
+        text = text[:-1]
+    if in_string:
+        text += '"'
+    return text.rstrip().rstrip(",") + "".join(reversed(stack))
+
+
+def loads_tolerant(text: str):
+    """
+    寬鬆地解析模型輸出的 JSON：去掉 ``` 區塊標記與前後多餘文字，
+    截斷的 JSON 會嘗試補齊；仍無法解析時回傳 None
+    """
+    text = _FENCE_RE.sub("", text.strip())
+    start = text.find("{")
+    if start < 0:
+        return None
+    end = text.rfind("}")
+    candidates = []
+    if end > start:
+        candidates.append(text[start:end + 1])
+    candidates.append(_close_json(text[start:]))
+    for candidate in candidates:
+        try:
+            data = json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(data, dict):
+            return data
+    return None
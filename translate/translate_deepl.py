@@ -1,55 +1,55 @@
-import deepl
-
-class DeeplTranslator:
-    def read_glossary_from_csv(self, file_path):
-        glossary = {}
-        with open(file_path, mode="r", encoding='utf-8') as f:
-            lines = f.readlines()
-            for line in lines:
-                source, target = line.strip().split(",")
-                glossary[source] = target
-        return glossary
-    def __init__(self, auth_key):
-        self.translator = deepl.Translator(auth_key)
-        # Create a en glossary
-        self.en_glossary_name = "EN Glossary"
-        source_lang = "EN"
-        target_lang = "ZH-HANT"
-        self.en_glossary_entries = self.read_glossary_from_csv("./translate/EN_2_ZH_glossary.csv")
-
-        self.en_glossary = self.translator.create_glossary(self.en_glossary_name, source_lang, target_lang, self.en_glossary_entries)
-
-
-        # Create a ja glossary
-        self.ja_glossary_name = "JA Glossary"
-        source_lang = "JA"
-        self.ja_glossary_entries = self.read_glossary_from_csv("./translate/JA_2_ZH_glossary.csv")
-
-        self.ja_glossary = self.translator.create_glossary(self.ja_glossary_name, source_lang, target_lang, self.ja_glossary_entries)
+import os
 
+import deepl
 
-        # Create a en glossary
-        self.de_glossary_name = "DE Glossary"
-        source_lang = "EN"
-        self.de_glossary_entries = self.read_glossary_from_csv("./translate/DE_2_ZH_glossary.csv")
+from translate.translation_cache import get_translation_cache, normalize_text
+from translate.glossary_manager import GlossaryManager, GLOSSARY_FILES, read_glossary_csv
+from translate.local_translator import LocalTranslator
 
-        self.de_glossary = self.translator.create_glossary(self.de_glossary_name, source_lang, target_lang, self.de_glossary_entries)
+# 明確設定為 1 時，沒有金鑰才改用本機替身 (離線開發與測試用)
+DEEPL_USE_LOCAL = os.getenv("DEEPL_USE_LOCAL", "0") == "1"
 
+class DeeplTranslator:
+    def read_glossary_from_csv(self, file_path):
+        return read_glossary_csv(file_path)
+
+    def __init__(self, auth_key, cache=None, translator=None):
+        if translator is None:
+            if auth_key:
+                translator = deepl.Translator(auth_key)
+            elif DEEPL_USE_LOCAL:
+                print("⚠️ 沒有設定 DEEPL_AUTH_KEY，使用本機翻譯替身 (DEEPL_USE_LOCAL=1)")
+                translator = LocalTranslator()
+            else:
+                raise ValueError("請先設定環境變數 DEEPL_AUTH_KEY (離線開發可設定 DEEPL_USE_LOCAL=1 使用本機替身)")
+        self.translator = translator
+        self.cache = cache or get_translation_cache()
+
+        # 依 CSV 內容雜湊沿用既有詞彙表，只有內容改變的語言才重新建立；
+        # 詞彙表版本同時用於快取 key，內容改變時快取的翻譯結果也跟著失效
+        self.glossaries, self.glossary_versions = GlossaryManager(self.translator).ensure(GLOSSARY_FILES)
 
     def translate_to_chinese(self, text, source_lang):
         print(f"Translating text: {text}", source_lang)
-        if source_lang not in ["EN", "JA", "DE"]:
-            raise ValueError("Source languagself.e must be 'EN', 'JA', or 'DE'")
+        return self.translate_many_to_chinese([text], source_lang)[0]
+
+    def translate_many_to_chinese(self, texts, source_lang):
+        """一次翻譯多段文字，只有快取中沒有的部分會以一個 DeepL 請求送出"""
+        if source_lang not in self.glossaries:
+            raise ValueError("Source language must be 'EN', 'JA', or 'DE'")
         
-        if source_lang == "EN":
-            glossary = self.en_glossary
-        elif source_lang == "JA":
-            glossary = self.ja_glossary
-        elif source_lang == "DE":
-            glossary = self.de_glossary
+        glossary = self.glossaries[source_lang]
             
-        result = self.translator.translate_text(text, source_lang=source_lang, target_lang="ZH-HANT", glossary=glossary, model_type="prefer_quality_optimized")
-        return result.text
+        texts = [normalize_text(text) for text in texts]
+        todo = [text for text in texts if text]
+        keys = [self.cache.make_key(text, source_lang, "ZH-HANT", self.glossary_versions[source_lang]) for text in todo]
+
+        def translate(pending):
+            results = self.translator.translate_text(pending, source_lang=source_lang, target_lang="ZH-HANT", glossary=glossary, model_type="prefer_quality_optimized")
+            return [result.text for result in results]
+
+        translated = iter(self.cache.get_many_or_compute(keys, todo, translate))
+        return [next(translated) if text else text for text in texts]
 
     # Example usage
     # translated_text = translate_to_chinese("Hello everyone, today we are going to discuss the issue regarding DDR Ratio. It was found that the ratio on DP is quite high this week. Does Martin know the reason?", "EN")
@@ -0,0 +1,178 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from concurrent.futures import Future
+
+from cachetools import LRUCache
+
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """統一全半形與空白，讓只差在空白的文字可以共用同一筆快取"""
+    return _SPACE_RE.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+
+
+def content_version(*parts) -> str:
+    """以內容雜湊當作詞彙表 / 知識庫版本，內容改變時舊的快取自然失效"""
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(json.dumps(part, ensure_ascii=False, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+class TranslationCache:
+    """
+    翻譯結果快取：
+    - 記憶體層為有上限的 LRU，可選擇再加一層 SQLite 持久化
+    - 同一個 key 同時有多個請求時只會呼叫一次上游 API，其餘等待同一個結果
+    - 記錄命中 / 未命中次數，方便調整容量
+    """
+
+    def __init__(self, maxsize: int = 10000, path: str = None):
+        self.memory = LRUCache(maxsize=maxsize)
+        self.lock = threading.Lock()
+        self.inflight = {}
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.shared = 0  # 搭上其他請求結果的次數
+        self.db = None
+        if path:
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute("CREATE TABLE IF NOT EXISTS translations (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            self.db.commit()
+
+    @staticmethod
+    def make_key(text: str, source_lang: str, target_lang: str, version: str = "") -> str:
+        raw = json.dumps([normalize_text(text), source_lang, target_lang, version], ensure_ascii=False)
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def _disk_get(self, key):
+        if self.db is None:
+            return None
+        with self.lock:
+            row = self.db.execute("SELECT value FROM translations WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _disk_put(self, key, value):
+        if self.db is None:
+            return
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO translations (key, value) VALUES (?, ?)", (key, value))
+            self.db.commit()
+
+    def get(self, key: str):
+        """只查快取不計算，沒有時回傳 None"""
+        with self.lock:
+            if key in self.memory:
+                self.hits += 1
+                return self.memory[key]
+        value = self._disk_get(key)
+        with self.lock:
+            if value is not None:
+                self.disk_hits += 1
+                self.memory[key] = value
+            else:
+                self.misses += 1
+        return value
+
+    def put(self, key: str, value):
+        with self.lock:
+            self.memory[key] = value
+        self._disk_put(key, value)
+
+    def get_or_compute(self, key: str, compute):
+        """有快取就直接回傳，否則呼叫 compute()；同一個 key 同時間只會呼叫一次 compute"""
+        return self.get_many_or_compute([key], [None], lambda _: [compute()])[0]
+
+    def get_many_or_compute(self, keys: list, texts: list, compute_many) -> list:
+        """
+        批次版本：只把沒有快取、也沒有其他請求正在處理的 texts 交給 compute_many(texts) 一次算完，
+        回傳與 keys 對應的結果清單
+        """
+        results = {}
+        waiting = {}
+        owned = {}
+        with self.lock:
+            for key, text in zip(keys, texts):
+                if key in results or key in waiting or key in owned:
+                    continue
+                if key in self.memory:
+                    self.hits += 1
+                    results[key] = self.memory[key]
+                elif key in self.inflight:
+                    self.shared += 1
+                    waiting[key] = self.inflight[key]
+                else:
+                    owned[key] = text
+                    self.inflight[key] = Future()
+
+        if owned:
+            futures = {key: self.inflight[key] for key in owned}
+            try:
+                pending = []
+                for key in owned:
+                    value = self._disk_get(key)
+                    if value is not None:
+                        results[key] = value
+                    else:
+                        pending.append(key)
+                with self.lock:
+                    self.disk_hits += len(owned) - len(pending)
+                    self.misses += len(pending)
+                if pending:
+                    values = compute_many([owned[key] for key in pending])
+                    for key, value in zip(pending, values):
+                        results[key] = value
+                        self._disk_put(key, value)
+                with self.lock:
+                    for key in owned:
+                        self.memory[key] = results[key]
+                for key, future in futures.items():
+                    future.set_result(results[key])
+            except Exception as e:
+                for future in futures.values():
+                    if not future.done():
+                        future.set_exception(e)
+                raise
+            finally:
+                with self.lock:
+                    for key in owned:
+                        self.inflight.pop(key, None)
+
+        for key, future in waiting.items():
+            results[key] = future.result()
+        return [results[key] for key in keys]
+
+    def stats(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.disk_hits + self.misses + self.shared
+            return {
+                "size": len(self.memory),
+                "maxsize": self.memory.maxsize,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "shared": self.shared,
+                "inflight": len(self.inflight),
+                "hit_rate": (lookups - self.misses) / lookups if lookups else 0.0,
+            }
+
+
+_default_cache = None
+
+
+def get_translation_cache() -> TranslationCache:
+    """行程內共用的翻譯快取，容量與持久化路徑由 TRANSLATION_CACHE_SIZE / TRANSLATION_CACHE_PATH 設定"""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = TranslationCache(
+            maxsize=int(os.getenv("TRANSLATION_CACHE_SIZE", "10000")),
+            path=os.getenv("TRANSLATION_CACHE_PATH") or None,
+        )
+    return _default_cache
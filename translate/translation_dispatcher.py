@@ -0,0 +1,75 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+
+class TranslationDispatcher:
+    """
+    跨會議、跨講者的批次翻譯派送器：
+    各個辨識器的待翻譯句子先在短時間窗內收集起來，依 (來源語言, 詞彙表) 分組，
+    每組只用一次 translate_many 呼叫，並在專用的執行緒池中執行，不阻塞事件迴圈；
+    結果再分別回填到各呼叫端的 future。
+    """
+
+    def __init__(self, translator, window: float = 0.05, max_batch: int = 50, max_workers: int = 4):
+        self.translator = translator
+        self.window = window
+        self.max_batch = max_batch
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="translate")
+        self.pending = {}  # group -> [(text, future)]
+        self.flush_handles = {}
+
+    def _group(self, source_lang: str):
+        glossaries = getattr(self.translator, "glossaries", {})
+        glossary = glossaries.get(source_lang)
+        return (source_lang, getattr(glossary, "glossary_id", None))
+
+    async def translate_many(self, texts: list, source_lang: str) -> list:
+        """把多段文字加入批次，等待各自的翻譯結果"""
+        if not texts:
+            return []
+        loop = asyncio.get_running_loop()
+        group = self._group(source_lang)
+        futures = []
+        batch = self.pending.setdefault(group, [])
+        for text in texts:
+            future = loop.create_future()
+            batch.append((text, future))
+            futures.append(future)
+
+        if len(batch) >= self.max_batch:
+            self._flush(group)
+        elif group not in self.flush_handles:
+            self.flush_handles[group] = loop.call_later(self.window, self._flush, group)
+        return await asyncio.gather(*futures)
+
+    async def translate(self, text: str, source_lang: str) -> str:
+        return (await self.translate_many([text], source_lang))[0]
+
+    def _flush(self, group):
+        handle = self.flush_handles.pop(group, None)
+        if handle is not None:
+            handle.cancel()
+        batch = self.pending.pop(group, [])
+        # 單次呼叫最多 max_batch 段 (DeepL 每個請求的上限)，大量文字分成多個請求，失敗也只影響該請求的呼叫端
+        loop = asyncio.get_running_loop()
+        for i in range(0, len(batch), self.max_batch):
+            loop.create_task(self._run(group, batch[i:i + self.max_batch]))
+
+    async def _run(self, group, batch):
+        source_lang = group[0]
+        texts = list(dict.fromkeys(text for text, _ in batch))
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(self.executor, self.translator.translate_many_to_chinese, texts, source_lang)
+            translated = dict(zip(texts, results))
+            for text, future in batch:
+                if not future.done():
+                    future.set_result(translated[text])
+        except Exception as e:
+            print(f"⚠️ 批次翻譯失敗 ({source_lang}, {len(texts)} 段): {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,217 @@
+import asyncio
+import hashlib
+import os
+import shutil
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import soundfile as sf
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+# 單一上傳檔的大小上限 (位元組)，預設 1 GB
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(1 << 30)))
+# 累積到這個大小才交給執行緒寫檔，減少切換次數
+UPLOAD_WRITE_SIZE = 1 << 20
+# 判斷格式需要的檔頭長度
+HEADER_BYTES = 12
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class InvalidAudio(Exception):
+    pass
+
+
+# 批次轉錄以 libsndfile 解碼，只接受它能讀取的格式 (WebM、M4A 需先在前端轉成 WAV / Ogg)
+DECODABLE = {".wav", ".flac", ".ogg"} | ({".mp3"} if "MP3" in sf.available_formats() else set())
+
+
+def sniff_audio(head: bytes):
+    """依檔頭判斷音訊格式，回傳副檔名；無法辨識時回傳 None"""
+    if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+        return ".wav"
+    if head[:4] == b"fLaC":
+        return ".flac"
+    if head[:4] == b"OggS":
+        return ".ogg"
+    if head[:4] == b"\x1a\x45\xdf\xa3":
+        return ".webm"
+    if head[4:8] == b"ftyp":
+        return ".m4a"
+    if head[:3] == b"ID3" or (len(head) >= 2 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0):
+        return ".mp3"
+    return None
+
+
+class _UploadFile:
+    """一次上傳的暫存檔：在執行緒中寫檔並同時計算 sha256"""
+
+    def __init__(self, store):
+        self.store = store
+        self.path = f"{store.directory}/.upload-{uuid.uuid4().hex}.part"
+        self.file = None
+        self.sha256 = hashlib.sha256()
+        self.head = b""
+        self.extension = None
+        self.size = 0
+        self.buffer = []
+        self.buffered = 0
+
+    def _write(self, data: bytes):
+        if self.file is None:
+            self.file = open(self.path, "wb")
+        self.sha256.update(data)
+        self.file.write(data)
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.store.executor, func, *args)
+
+    async def feed(self, data: bytes):
+        if not data:
+            return
+        self.size += len(data)
+        if self.size > self.store.max_bytes:
+            raise UploadTooLarge(f"檔案超過上限 {self.store.max_bytes} bytes")
+        if self.extension is None:
+            # 一收到檔頭就檢查格式，不是音訊就不必收完整個檔案
+            self.head += data[:HEADER_BYTES]
+            if len(self.head) >= HEADER_BYTES:
+                self._check(sniff_audio(self.head))
+        self.buffer.append(data)
+        self.buffered += len(data)
+        if self.buffered >= UPLOAD_WRITE_SIZE:
+            await self.flush()
+
+    def _check(self, extension):
+        if extension is None:
+            raise InvalidAudio("檔案是空的或無法辨識的音訊格式")
+        if extension not in DECODABLE:
+            raise InvalidAudio(f"不支援的音訊格式 {extension.lstrip('.')}，請上傳 WAV、FLAC 或 Ogg")
+        self.extension = extension
+
+    async def flush(self):
+        if self.buffer:
+            data = b"".join(self.buffer)
+            self.buffer, self.buffered = [], 0
+            await self._run(self._write, data)
+
+    async def finish(self):
+        await self.flush()
+        if self.extension is None:
+            self._check(sniff_audio(self.head))
+        await self._run(self.file.close)
+
+    def discard(self):
+        if self.file is not None:
+            self.file.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class UploadStore:
+    """
+    串流接收上傳的錄音：request body 一邊收一邊在執行緒中寫入暫存檔，
+    不會把整個檔案讀進記憶體；同時檢查大小上限、驗證檔頭並計算 sha256。
+    內容以雜湊命名存放，相同內容的重複上傳只保留一份，再以錄音 ID 的檔名連結過去。
+    """
+
+    def __init__(self, directory: str, max_bytes: int = UPLOAD_MAX_BYTES, max_workers: int = 4):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="upload")
+
+    async def save(self, request, name: str) -> dict:
+        """接收 multipart (第一個檔案欄位) 或直接以 body 上傳的音訊，存成 {name}{副檔名}"""
+        content_length = request.headers.get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > self.max_bytes + 64 * 1024:
+            raise UploadTooLarge(f"檔案超過上限 {self.max_bytes} bytes")
+
+        upload = _UploadFile(self)
+        try:
+            content_type, params = parse_options_header(request.headers.get("content-type", ""))
+            if content_type == b"multipart/form-data" and b"boundary" in params:
+                await self._receive_multipart(request, params[b"boundary"], upload)
+            else:
+                async for chunk in request.stream():
+                    await upload.feed(chunk)
+            await upload.finish()
+            return await asyncio.get_running_loop().run_in_executor(self.executor, self._commit, upload, name)
+        except BaseException:
+            upload.discard()
+            raise
+
+    async def _receive_multipart(self, request, boundary: bytes, upload: _UploadFile):
+        state = {"header": b"", "headers": {}, "is_file": False, "done": False}
+        pending = []
+
+        def on_header_field(data, start, end):
+            state["header"] += data[start:end]
+
+        def on_header_value(data, start, end):
+            state["headers"][state["header"].lower()] = state["headers"].get(state["header"].lower(), b"") + data[start:end]
+
+        def on_header_end():
+            state["header"] = b""
+
+        def on_headers_finished():
+            _, options = parse_options_header(state["headers"].get(b"content-disposition", b""))
+            # 只收第一個檔案欄位，其他表單欄位略過
+            state["is_file"] = not state["done"] and b"filename" in options
+
+        def on_part_data(data, start, end):
+            if state["is_file"]:
+                pending.append(bytes(data[start:end]))
+
+        def on_part_end():
+            if state["is_file"]:
+                state["done"] = True
+            state["is_file"] = False
+            state["headers"] = {}
+
+        parser = MultipartParser(boundary, {
+            "on_header_field": on_header_field,
+            "on_header_value": on_header_value,
+            "on_header_end": on_header_end,
+            "on_headers_finished": on_headers_finished,
+            "on_part_data": on_part_data,
+            "on_part_end": on_part_end,
+        })
+        async for chunk in request.stream():
+            parser.write(chunk)
+            for data in pending:
+                await upload.feed(data)
+            pending.clear()
+        parser.finalize()
+        if not state["done"]:
+            raise InvalidAudio("沒有收到檔案欄位")
+
+    def _commit(self, upload: _UploadFile, name: str) -> dict:
+        digest = upload.sha256.hexdigest()
+        content_path = f"{self.directory}/{digest}{upload.extension}"
+        duplicate = os.path.exists(content_path)
+        if duplicate:
+            os.remove(upload.path)
+        else:
+            os.replace(upload.path, content_path)
+
+        filename = f"{self.directory}/{name}{upload.extension}"
+        if not (os.path.exists(filename) and os.path.samefile(filename, content_path)):
+            tmp = f"{filename}.{uuid.uuid4().hex}.tmp"
+            try:
+                os.link(content_path, tmp)
+            except OSError:
+                shutil.copyfile(content_path, tmp)
+            os.replace(tmp, filename)
+        return {
+            "filename": filename,
+            "content_path": content_path,
+            "sha256": digest,
+            "size": upload.size,
+            "format": upload.extension.lstrip("."),
+            "duplicate": duplicate,
+        }
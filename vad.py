@@ -0,0 +1,169 @@
+import os
+import threading
+import numpy as np
+
+SAMPLE_RATE = 16000
+
+
+class EnergyVAD:
+    """
+    以音框能量與過零率判斷語音 (整批音框以 NumPy 向量化計算)。
+    噪音底線以「緩慢上升的最小值」追蹤：遇到更安靜的音框立即下降，否則每秒最多上升 noise_rise_db，
+    一開口就講話的錄音也不會把底線拉到語音的音量；麥克風底噪不同的人也能用同一組參數。
+    """
+
+    def __init__(self, sample_rate: int = SAMPLE_RATE, frame_ms: int = 30, margin_db: float = 9.0,
+                 min_energy_db: float = -55.0, max_zcr: float = 0.3, noise_rise_db: float = 1.0):
+        self.sample_rate = sample_rate
+        self.frame_length = sample_rate * frame_ms // 1000
+        self.margin_db = margin_db
+        self.min_energy_db = min_energy_db
+        self.max_zcr = max_zcr
+        self.rise = noise_rise_db * frame_ms / 1000.0  # 每個音框最多上升的 dB
+        self.noise_db = None
+
+    def classify(self, frames: np.ndarray) -> np.ndarray:
+        """frames 為 (音框數, frame_length) 的 int16 陣列，回傳每個音框是否為語音"""
+        x = frames.astype(np.float32) / 32768.0
+        energy_db = 10.0 * np.log10(np.mean(x * x, axis=1) + 1e-10)
+        zcr = np.mean(np.signbit(x[:, 1:]) != np.signbit(x[:, :-1]), axis=1)
+
+        # noise[i] = min(noise[i-1] + rise, energy[i])，展開成累積最小值以向量化
+        steps = np.arange(len(energy_db)) * self.rise
+        start = self.min_energy_db if self.noise_db is None else self.noise_db + self.rise
+        noise = np.minimum.accumulate(np.minimum(energy_db - steps, start)) + steps
+        self.noise_db = float(noise[-1])
+
+        threshold = np.maximum(noise + self.margin_db, self.min_energy_db)
+        # 高過零率但能量不夠高的多半是嘶聲或風切聲
+        return (energy_db > threshold) & ((zcr < self.max_zcr) | (energy_db > threshold + 10.0))
+
+
+class WebRTCVAD:
+    """webrtcvad 的包裝，需另外安裝 webrtcvad 套件"""
+
+    def __init__(self, sample_rate: int = SAMPLE_RATE, frame_ms: int = 30, aggressiveness: int = 2):
+        import webrtcvad
+
+        self.sample_rate = sample_rate
+        self.frame_length = sample_rate * frame_ms // 1000
+        self.vad = webrtcvad.Vad(aggressiveness)
+
+    def classify(self, frames: np.ndarray) -> np.ndarray:
+        return np.array([self.vad.is_speech(frame.tobytes(), self.sample_rate) for frame in frames], dtype=bool)
+
+
+def create_vad(sample_rate: int = SAMPLE_RATE):
+    """依 VAD_BACKEND 環境變數建立 VAD (energy / webrtc)"""
+    if os.getenv("VAD_BACKEND", "energy") == "webrtc":
+        try:
+            return WebRTCVAD(sample_rate)
+        except ImportError:
+            print("⚠️ 找不到 webrtcvad，改用能量式 VAD")
+    return EnergyVAD(sample_rate)
+
+
+class SpeechSegmenter:
+    """
+    隨著音訊送入逐步標記語音片段 (取樣點範圍)，
+    並找出「語音後接一段夠長的靜音」的位置作為一句話的邊界。
+    """
+
+    def __init__(self, vad=None, sample_rate: int = SAMPLE_RATE, hangover_ms: int = 300,
+                 min_speech_ms: int = 120, pad_ms: int = 200, utterance_gap_ms: int = 700):
+        self.vad = vad or create_vad(sample_rate)
+        self.sample_rate = sample_rate
+        self.frame_length = self.vad.frame_length
+        self.hangover_frames = max(1, hangover_ms * sample_rate // 1000 // self.frame_length)
+        self.min_speech = min_speech_ms * sample_rate // 1000
+        self.pad = pad_ms * sample_rate // 1000
+        self.utterance_gap = utterance_gap_ms * sample_rate // 1000
+
+        self.segments = []  # 已結束的語音片段 [(start, end)]
+        self.current_start = None  # 進行中的語音片段起點
+        self.processed = 0  # 已分析到的取樣點
+        self._silence_frames = 0
+        self._leftover = np.empty(0, dtype=np.int16)
+        self._lock = threading.Lock()
+
+    def feed(self, samples: np.ndarray):
+        """送入新的 int16 音訊，只分析完整的音框，不足一個音框的部分留到下次"""
+        if len(self._leftover):
+            samples = np.concatenate([self._leftover, samples])
+        count = len(samples) // self.frame_length
+        self._leftover = samples[count * self.frame_length:].copy()
+        if count == 0:
+            return
+
+        flags = self.vad.classify(samples[:count * self.frame_length].reshape(count, self.frame_length))
+        with self._lock:
+            frame_start = self.processed
+            for is_speech in flags:
+                if is_speech:
+                    if self.current_start is None:
+                        self.current_start = frame_start
+                    self._silence_frames = 0
+                elif self.current_start is not None:
+                    self._silence_frames += 1
+                    if self._silence_frames >= self.hangover_frames:
+                        end = frame_start + self.frame_length - self._silence_frames * self.frame_length
+                        if end - self.current_start >= self.min_speech:
+                            self.segments.append((self.current_start, end))
+                        self.current_start = None
+                        self._silence_frames = 0
+                frame_start += self.frame_length
+            self.processed = frame_start
+
+    def speech_ranges(self, start: int = 0, end: int = None) -> list:
+        """回傳 [start, end) 中含前後緩衝的語音範圍，重疊的範圍會合併"""
+        with self._lock:
+            end = self.processed if end is None else end
+            segments = [(self.current_start, end)] if self.current_start is not None else []
+            # 由新到舊找，只看與 start 之後重疊的片段，成本不隨錄音長度成長
+            for segment in reversed(self.segments):
+                if segment[1] + self.pad <= start:
+                    break
+                segments.append(segment)
+
+        ranges = []
+        for seg_start, seg_end in reversed(segments):
+            s = max(seg_start - self.pad, start)
+            e = min(seg_end + self.pad, end)
+            if s >= e:
+                continue
+            if ranges and s <= ranges[-1][1]:
+                ranges[-1] = (ranges[-1][0], max(ranges[-1][1], e))
+            else:
+                ranges.append((s, e))
+        return ranges
+
+    def in_speech(self) -> bool:
+        return self.current_start is not None
+
+    def last_boundary(self, start: int = 0):
+        """
+        回傳 start 之後最後一個句子邊界 (語音結束後接著至少 utterance_gap 的靜音)，
+        邊界取在靜音中、語音結束後 pad 的位置；沒有邊界時回傳 None
+        """
+        with self._lock:
+            next_start = self.current_start if self.current_start is not None else self.processed
+            for seg_start, seg_end in reversed(self.segments):
+                if seg_end + self.pad <= start:
+                    break
+                if next_start - seg_end >= self.utterance_gap:
+                    return seg_end + self.pad
+                next_start = seg_start
+        return None
+
+    def compact(self, audio: np.ndarray, max_gap_ms: int = 300) -> np.ndarray:
+        """把整段錄音的語音片段接起來，片段之間的靜音最多保留 max_gap_ms"""
+        max_gap = max_gap_ms * self.sample_rate // 1000
+        ranges = self.speech_ranges(0, len(audio))
+        if not ranges:
+            return audio[:0]
+        pieces = [audio[ranges[0][0]:ranges[0][1]]]
+        for (_, prev_end), (s, e) in zip(ranges, ranges[1:]):
+            if s - prev_end > 0:
+                pieces.append(audio[prev_end:prev_end + min(s - prev_end, max_gap)])
+            pieces.append(audio[s:e])
+        return np.concatenate(pieces)
@@ -0,0 +1,177 @@
+import os
+import time
+
+import httpx
+
+from audio_store import multipart_wav_body, SAMPLE_RATE
+
+WHISPER_SERVER_URL = "http://10.121.240.4"
+# 預設為 10.121.240.40~41 上 8760~8763 四個 port 的 Whisper 伺服器，可用 WHISPER_BACKENDS (逗號分隔) 覆寫
+DEFAULT_BACKENDS = [f"{WHISPER_SERVER_URL}{host}:876{port}" for host in range(2) for port in range(4)]
+LANGUAGE_MAP = {
+    "en-US": "en",
+    "cmn-Hant-TW": "zh",
+    "ja-JP": "ja",
+    "de-DE": "de",
+}
+
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+
+class Backend:
+    """單一 Whisper GPU 伺服器的負載與健康狀態"""
+
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+        self.outstanding = 0  # 目前處理中的請求數
+        self.ewma_latency = None  # 以 EWMA 平滑的回應時間 (秒)
+        self.failures = 0  # 連續失敗次數
+        self.ejections = 0  # 連續被剔除的次數，用來拉長剔除時間
+        self.ejected_until = 0.0
+
+    def available(self, now: float) -> bool:
+        return now >= self.ejected_until
+
+    def stats(self) -> dict:
+        return {
+            "url": self.url,
+            "outstanding": self.outstanding,
+            "ewma_latency": self.ewma_latency,
+            "failures": self.failures,
+            "ejected": not self.available(time.monotonic()),
+        }
+
+
+class WhisperClient:
+    """
+    非同步的 Whisper 用戶端：
+    - 使用共用的 httpx.AsyncClient，保持 keep-alive 連線，不會每次都重新建立 TCP
+    - 依「處理中請求數」或「處理中請求數 × EWMA 延遲」挑選後端
+    - 被動健康檢查：連續失敗的伺服器會被暫時剔除，剔除時間隨次數加倍
+    """
+
+    def __init__(self, backends=None, balancer: str = None, timeout: float = 120.0, max_connections: int = 64,
+                 max_failures: int = 3, eject_seconds: float = 10.0, max_eject_seconds: float = 300.0,
+                 retries: int = 1, ewma_alpha: float = 0.3):
+        if backends is None:
+            env_backends = os.getenv("WHISPER_BACKENDS", "")
+            backends = [url.strip() for url in env_backends.split(",") if url.strip()] or DEFAULT_BACKENDS
+        self.backends = [Backend(url) for url in backends]
+        self.balancer = balancer or os.getenv("WHISPER_BALANCER", "ewma")
+        self.max_failures = max_failures
+        self.eject_seconds = eject_seconds
+        self.max_eject_seconds = max_eject_seconds
+        self.retries = retries
+        self.ewma_alpha = ewma_alpha
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(timeout, connect=5.0),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+    def _score(self, backend: Backend) -> tuple:
+        if self.balancer == "least_outstanding":
+            return (backend.outstanding,)
+        # 尚未量測過的後端視為最快，讓每台都有機會被量測到
+        latency = backend.ewma_latency if backend.ewma_latency is not None else 0.0
+        return ((backend.outstanding + 1) * latency, backend.outstanding)
+
+    def _pick(self, exclude) -> Backend:
+        now = time.monotonic()
+        candidates = [b for b in self.backends if b not in exclude and b.available(now)]
+        if not candidates:
+            # 全部都被剔除時，選最快恢復的那台，避免完全無法服務
+            candidates = sorted((b for b in self.backends if b not in exclude), key=lambda b: b.ejected_until)[:1]
+        if not candidates:
+            return None
+        return min(candidates, key=self._score)
+
+    def _record_success(self, backend: Backend, latency: float):
+        backend.failures = 0
+        backend.ejections = 0
+        if backend.ewma_latency is None:
+            backend.ewma_latency = latency
+        else:
+            backend.ewma_latency = self.ewma_alpha * latency + (1 - self.ewma_alpha) * backend.ewma_latency
+
+    def _record_failure(self, backend: Backend):
+        backend.failures += 1
+        if backend.failures >= self.max_failures:
+            backend.ejections += 1
+            backend.failures = 0
+            duration = min(self.eject_seconds * 2 ** (backend.ejections - 1), self.max_eject_seconds)
+            backend.ejected_until = time.monotonic() + duration
+            print(f"⚠️ Whisper 伺服器 {backend.url} 連續失敗，暫停使用 {duration:.0f} 秒")
+
+    async def transcribe(self, samples, language_code: str, prompt: str = "", sample_rate: int = SAMPLE_RATE) -> dict:
+        """送出一段 int16 PCM 進行轉錄，回傳 Whisper 的完整結果；失敗時回傳含 error 的結果"""
+        data = {"language": LANGUAGE_MAP.get(language_code, "en"), "word_timestamps": "true"}
+        if prompt:
+            data["prompt"] = prompt
+
+        tried = []
+        error = "沒有可用的 Whisper 伺服器"
+        for _ in range(self.retries + 1):
+            backend = self._pick(tried)
+            if backend is None:
+                break
+            tried.append(backend)
+
+            content_type, body = multipart_wav_body(samples, data, sample_rate)
+            backend.outstanding += 1
+            start_time = time.monotonic()
+            try:
+                response = await self.client.post(
+                    f"{backend.url}/transcribe",
+                    content=_iter_body(body),
+                    headers={"Content-Type": content_type, "Content-Length": str(len(body))},
+                )
+            except httpx.HTTPError as e:
+                self._record_failure(backend)
+                error = f"Exception: {e!r}"
+                continue
+            finally:
+                backend.outstanding -= 1
+
+            if response.status_code == 200:
+                try:
+                    result = response.json()
+                except ValueError:
+                    # 後端回了 200 卻不是 JSON (例如代理伺服器的錯誤頁)，視為該後端失敗
+                    self._record_failure(backend)
+                    error = f"Invalid response: {response.text[:200]}"
+                    continue
+                self._record_success(backend, time.monotonic() - start_time)
+                return result
+            error = f"Error: {response.status_code} - {response.text}"
+            if response.status_code < 500:
+                # 請求本身有問題，換伺服器也沒用
+                break
+            self._record_failure(backend)
+
+        print(f"⚠️ Whisper 辨識失敗: {error}")
+        return {"text": error, "error": True}
+
+    def stats(self) -> list:
+        return [backend.stats() for backend in self.backends]
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+async def _iter_body(body, chunk_size: int = UPLOAD_CHUNK_SIZE):
+    while True:
+        chunk = body.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+_default_client = None
+
+
+def get_whisper_client() -> WhisperClient:
+    """整個行程共用一個 WhisperClient，連線池與後端狀態才有意義"""
+    global _default_client
+    if _default_client is None:
+        _default_client = WhisperClient()
+    return _default_client